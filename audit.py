@@ -0,0 +1,516 @@
+"""审核引擎：八大审核检查（不依赖 Streamlit，可被脚本直接导入）"""
+import html
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+
+from draft import parse_draft
+from matcher import approx_search
+from rule_pack import get_active_rules
+
+# 计入「八大审核」通过数的检查项（check9 仅供参考）
+SCORED_CHECKS = ["check1", "check2", "check3", "check4", "check5", "check6", "check7", "check8"]
+
+def count_passed(results):
+    return sum(1 for k in SCORED_CHECKS if results.get(k, {}).get("status") == "pass")
+
+# ========== 规则匹配 ==========
+def scan_rules(content, rules=None):
+    """单次扫描全文，返回 {(类别, 键): [命中位置, ...]}"""
+    rules = rules or get_active_rules()
+    return rules.matcher.scan(content)
+
+class ExceptionIndex:
+    """禁词例外短语（如「第一口奶粉」「过敏史」）的区间索引。
+
+    命中只有被同一禁词的某个例外短语完整覆盖时才豁免，查询为 O(log n)。"""
+
+    def __init__(self, spans_by_word):
+        self._starts = {}
+        self._max_ends = {}
+        for word, spans in spans_by_word.items():
+            spans = sorted(spans)
+            max_ends = []
+            reach = -1
+            for _, end in spans:
+                reach = max(reach, end)
+                max_ends.append(reach)
+            self._starts[word] = [s for s, _ in spans]
+            self._max_ends[word] = max_ends
+
+    @classmethod
+    def from_hits(cls, hits):
+        """由 scan_rules 的结果构建"""
+        spans_by_word = {}
+        for label, positions in hits.items():
+            if label[0] != "exception":
+                continue
+            _, word, exc = label
+            spans_by_word.setdefault(word, []).extend((p, p + len(exc)) for p in positions)
+        return cls(spans_by_word)
+
+    def covers(self, word, start, end):
+        """[start, end) 是否落在某个例外短语区间内"""
+        starts = self._starts.get(word)
+        if not starts:
+            return False
+        i = bisect_right(starts, start) - 1
+        return i >= 0 and self._max_ends[word][i] >= end
+
+# ========== 指标 ==========
+class AuditProbe:
+    """把一次审核的各阶段耗时和计数记入 metrics.MetricsRegistry。
+
+    check(name) 记录距上一个记录点的耗时，因此要按执行顺序在每项检查结束时调用"""
+
+    def __init__(self, registry, mode):
+        self.mode = mode
+        self._stage_seconds = registry.histogram("audit_stage_seconds", "审核各阶段耗时（秒）", ["mode", "stage"])
+        self._check_seconds = registry.histogram("audit_check_seconds", "单项检查耗时（秒）", ["check"])
+        self._runs = registry.counter("audit_runs_total", "审核次数", ["mode"])
+        self._chars = registry.counter("audit_chars_processed_total", "审核处理的字符数", ["mode"])
+        self._hits = registry.counter("audit_hits_scanned_total", "各项检查读取的规则命中数", ["check"])
+        self._exceptions = registry.counter("audit_exceptions_evaluated_total", "禁词命中做例外判断的次数")
+        self._paragraphs = registry.counter("audit_paragraph_cache_total", "增量审核段落缓存命中情况", ["result"])
+        self._start = self._mark = time.perf_counter()
+
+    def _lap(self):
+        now = time.perf_counter()
+        elapsed = now - self._mark
+        self._mark = now
+        return elapsed
+
+    def paragraph(self, cached):
+        self._paragraphs.inc(result="hit" if cached else "miss")
+
+    def scanned(self, chars):
+        self._stage_seconds.observe(self._lap(), mode=self.mode, stage="scan")
+        self._runs.inc(mode=self.mode)
+        self._chars.inc(chars, mode=self.mode)
+
+    def check(self, name, hits=0, exceptions=0):
+        self._check_seconds.observe(self._lap(), check=name)
+        if hits:
+            self._hits.inc(hits, check=name)
+        if exceptions:
+            self._exceptions.inc(exceptions)
+
+    def done(self):
+        self._stage_seconds.observe(time.perf_counter() - self._start, mode=self.mode, stage="total")
+
+class _NullProbe:
+    def paragraph(self, cached):
+        pass
+
+    def scanned(self, chars):
+        pass
+
+    def check(self, name, hits=0, exceptions=0):
+        pass
+
+    def done(self):
+        pass
+
+NULL_PROBE = _NullProbe()
+
+# 审核2 要求的中文字数区间（含两端）
+WORD_COUNT_RANGE = (800, 900)
+
+# ========== 工具函数 ==========
+def extract_title(content):
+    return parse_draft(content).title
+
+def detect_titles(content):
+    """智能检测标题，支持多种格式（见 draft.ParsedDraft）"""
+    return list(parse_draft(content).titles)
+
+def check_forbidden_word(content, word, positions=None, exc_index=None, rules=None):
+    """检查禁词是否出现，返回违规位置列表。
+
+    positions / exc_index 为整篇扫描一次得到的命中位置和例外区间索引，省略时现场构建"""
+    if positions is None or exc_index is None:
+        hits = scan_rules(content, rules)
+        positions = hits.get(("forbidden", word), [])
+        exc_index = ExceptionIndex.from_hits(hits)
+    violations = []
+    for idx in positions:
+        if exc_index.covers(word, idx, idx + len(word)):
+            continue
+        ctx = content[max(0, idx - 15):idx + len(word) + 15]
+        violations.append({"pos": idx, "context": ctx})
+    return violations
+
+def apply_edits(content, edits):
+    """从左到右一次拼接应用一批编辑，edits 中每项为 {"pos": 原文位置, "old": 原文片段, "new": 替换内容}。
+
+    old 为空表示在 pos 处插入。按 pos 排序（同一位置保持传入顺序），与已应用编辑重叠的跳过。
+    返回 (新文本, 变更列表)，变更的 pos / new_pos 分别为 old 在原文、new 在新文本中的起点"""
+    parts = []
+    changes = []
+    start = 0
+    shift = 0
+    for _, e in sorted(enumerate(edits), key=lambda x: (x[1]["pos"], x[0])):
+        pos = e["pos"]
+        if pos < start:
+            continue
+        parts.append(content[start:pos])
+        parts.append(e["new"])
+        changes.append({"old": e["old"], "new": e["new"], "pos": pos, "new_pos": pos + shift})
+        shift += len(e["new"]) - len(e["old"])
+        start = pos + len(e["old"])
+    parts.append(content[start:])
+    return "".join(parts), changes
+
+def find_forbidden_edits(content, replacements, rules=None, hits=None):
+    """把正文中不在例外短语内的禁词命中整理成 apply_edits 的编辑，replacements 为 {禁词: 替换词}。
+
+    同一位置有多个禁词命中时较长的排在前面"""
+    if hits is None:
+        hits = scan_rules(content, rules)
+    exc_index = ExceptionIndex.from_hits(hits)
+    found = []
+    for word in replacements:
+        for idx in hits.get(("forbidden", word), []):
+            if not exc_index.covers(word, idx, idx + len(word)):
+                found.append((idx, -len(word), word))
+    found.sort()
+    return [{"pos": idx, "old": word, "new": replacements[word]} for idx, _, word in found]
+
+def replace_forbidden_words(content, replacements, rules=None):
+    """一次扫描替换多个禁词，跳过例外短语覆盖的命中。replacements 为 {禁词: 替换词}。
+
+    同一位置有多个禁词命中时取最长的，重叠的命中只替换先出现的。
+    返回 (新文本, 变更列表)，变更的 pos 为在原文中的位置、new_pos 为在新文本中的位置"""
+    return apply_edits(content, find_forbidden_edits(content, replacements, rules))
+
+# 近似匹配缺失的不可修改话术时每 10 个字允许 1 处差异，最多 3 处
+FUZZY_CHARS_PER_EDIT = 10
+FUZZY_MAX_EDITS = 3
+
+def find_fixed_phrase_edits(content, rules=None):
+    """正文中与缺失的不可修改话术只差几个字的片段（漏了「的」、标点半角、空格不同等），
+    整理成还原为原话术的 apply_edits 编辑，每条话术只还原第一处。
+
+    片段跨行或与正文中已有的其他话术重叠时不改"""
+    rules = rules or get_active_rules()
+    draft = parse_draft(content)
+    missing = [sp["text"] for sp in rules.fixed_selling_points if sp["text"] not in content]
+    if not missing:
+        return []
+    protected = []
+    for sp in rules.fixed_selling_points:
+        pos = content.find(sp["text"])
+        while pos != -1:
+            protected.append((pos, pos + len(sp["text"])))
+            pos = content.find(sp["text"], pos + 1)
+    edits = []
+    for text in missing:
+        max_edits = min(FUZZY_MAX_EDITS, max(1, len(text) // FUZZY_CHARS_PER_EDIT))
+        for s, e, _ in approx_search(text, content, max_edits, draft.body_start, draft.body_end):
+            old = content[s:e]
+            if "\n" not in old and not any(ps < e and s < pe for ps, pe in protected):
+                edits.append({"pos": s, "old": old, "new": text})
+                protected.append((s, e))
+                break
+    return edits
+
+# 插入缺失话术时，在含这些锚点的第一句之后插入
+CATEGORY_ANCHORS = {
+    "防敏-水解技术": ["水解", "防敏", "蛋白", "GINI", "致敏"],
+    "自护力": ["自护", "HMO", "双菌", "保护力", "菌菌", "肚肚"],
+    "基础营养": ["营养", "维生素", "乳糖", "口味"],
+}
+
+def _insertion_point(body, anchors):
+    """第一个在正文中出现、且之后有句末标点或换行的锚点所在句的句末位置，都没有时返回 None"""
+    for anchor in anchors:
+        pos = body.find(anchor)
+        if pos != -1:
+            end_pos = body.find("。", pos)
+            if end_pos == -1:
+                end_pos = body.find("！", pos)
+            if end_pos == -1:
+                end_pos = body.find("\n", pos)
+            if end_pos != -1:
+                return end_pos + 1
+    return None
+
+def auto_insert_fixed_phrases(content, rules=None):
+    """自动插入缺失的不可修改话术。
+
+    所有插入点都按原文偏移一次规划好，再一次拼接生成结果。
+    返回 (修复后的内容, 插入记录)，记录中 pos 为插入文本在修复后内容中的起点、offset 为原文中的插入位置"""
+    rules = rules or get_active_rules()
+    draft = parse_draft(content)
+    missing_by_cat = {}
+    for item in rules.fixed_selling_points:
+        missing = missing_by_cat.setdefault(item["category"], [])
+        if item["text"] not in content:
+            missing.append(item["text"])
+
+    if not any(missing_by_cat.values()):
+        return content, []
+
+    body_start = draft.body_start
+    body = draft.body
+    plan = []
+    for cat, missing_phrases in missing_by_cat.items():
+        at = _insertion_point(body, CATEGORY_ANCHORS.get(cat, []))
+        # 没有锚点时插在正文末尾、结尾空行之前，下一节的小标题仍独占一行
+        offset = body_start + (len(body.rstrip()) if at is None else at)
+        for phrase in missing_phrases:
+            plan.append((offset, len(plan), phrase))
+    plan.sort()
+
+    parts = []
+    edits = []
+    cursor = 0
+    out_len = 0
+    last_char = ""
+    for offset, _, phrase in plan:
+        if offset > cursor:
+            parts.append(content[cursor:offset])
+            out_len += offset - cursor
+            last_char = content[offset - 1]
+            cursor = offset
+        insert_text = phrase
+        if offset > body_start and last_char not in "。！\n":
+            insert_text = "。" + insert_text
+        if not insert_text.endswith(("。", "！")):
+            insert_text += "。"
+        parts.append(insert_text)
+        edits.append({"pos": out_len, "offset": offset, "text": insert_text, "phrase": phrase})
+        out_len += len(insert_text)
+        last_char = insert_text[-1]
+    parts.append(content[cursor:])
+    return "".join(parts), edits
+
+def run_all_checks(content, rules=None, metrics=None):
+    """运行全部审核检查，返回结果字典。传入 metrics（MetricsRegistry）时记录各项检查的耗时和计数"""
+    rules = rules or get_active_rules()
+    probe = AuditProbe(metrics, "full") if metrics else NULL_PROBE
+    hits = scan_rules(content, rules)
+    probe.scanned(len(content))
+    results = build_check_results(parse_draft(content), hits, rules, probe)
+    probe.done()
+    return results
+
+def _count_hits(hits, kind):
+    return sum(len(v) for k, v in hits.items() if k[0] == kind)
+
+def build_check_results(draft, hits, rules, probe=NULL_PROBE):
+    """由解析好的稿件（ParsedDraft）和全文规则命中汇总出 check1-check9 结果"""
+    results = {}
+    content = draft.text
+    title = draft.title
+    tags = draft.tags
+    exc_index = ExceptionIndex.from_hits(hits)
+
+    # 审核1: 卖点顺序
+    positions = {}
+    for cat in rules.order_anchors:
+        found_at = hits.get(("order", cat))
+        positions[cat] = found_at[0] if found_at else -1
+    cats = list(rules.order_anchors)
+    order_ok = True
+    order_details = []
+    for i, cat in enumerate(cats):
+        pos = positions[cat]
+        found = pos != -1
+        order_details.append({"category": cat, "position": pos, "found": found})
+        if not found:
+            order_ok = False
+        elif i > 0 and positions[cats[i - 1]] != -1 and pos < positions[cats[i - 1]]:
+            order_ok = False
+    results["check1"] = {"status": "pass" if order_ok else "fail", "details": order_details}
+    probe.check("check1", _count_hits(hits, "order"))
+
+    # 审核2: 正文字数（800-900字）
+    lo, hi = WORD_COUNT_RANGE
+    word_count = draft.word_count
+    results["check2"] = {"status": "pass" if lo <= word_count <= hi else "fail", "count": word_count}
+    probe.check("check2")
+
+    # 审核3: 标题数量（智能检测）
+    detected_titles = list(draft.titles)
+    title_count = len(detected_titles)
+    if title_count >= 3:
+        results["check3"] = {"status": "pass", "count": title_count, "titles": detected_titles}
+    else:
+        results["check3"] = {"status": "fail", "count": title_count, "title": title,
+                             "titles": detected_titles,
+                             "note": f"当前{title_count}个标题，需提供3个备选"}
+    probe.check("check3")
+
+    # 审核4: 标签
+    missing_tags = [t for t in rules.required_tags if t not in tags]
+    results["check4"] = {
+        "status": "pass" if len(tags) >= 10 and not missing_tags else "fail",
+        "count": len(tags), "missing": missing_tags, "tags": list(tags),
+    }
+    probe.check("check4")
+
+    # 审核5: 关键词
+    kw_items = []
+    all_titles_text = " ".join(detected_titles) if detected_titles else title
+    for w in rules.title_keywords:
+        kw_items.append({"scope": "标题", "word": w, "found": w in all_titles_text})
+    for w in rules.body_keywords:
+        kw_items.append({"scope": "正文", "word": w, "found": ("keyword", w) in hits})
+    for w in rules.cover_keywords:
+        kw_items.append({"scope": "封面(需人工确认)", "word": w, "found": ("keyword", w) in hits})
+    results["check5"] = {
+        "status": "pass" if all(r["found"] for r in kw_items) else "fail",
+        "items": kw_items,
+    }
+    probe.check("check5", _count_hits(hits, "keyword"))
+
+    # 审核6: 禁词
+    fw_items = []
+    evaluated = 0
+    for cat, words in rules.forbidden_words.items():
+        for w in words:
+            positions = hits.get(("forbidden", w), [])
+            evaluated += len(positions)
+            violations = check_forbidden_word(content, w, positions, exc_index, rules)
+            rep = rules.forbidden_replacements.get(w, "删除")
+            fw_items.append({
+                "category": cat, "word": w,
+                "found": len(violations) > 0,
+                "violations": violations,
+                "replacement": rep,
+            })
+    results["check6"] = {
+        "status": "fail" if any(r["found"] for r in fw_items) else "pass",
+        "items": fw_items,
+    }
+    probe.check("check6", evaluated + _count_hits(hits, "exception"), evaluated)
+
+    # 审核7: 必提需润色卖点
+    pp_items = []
+    for sp in rules.paraphrase_selling_points:
+        found = ("paraphrase", sp["idx"]) in hits
+        pp_items.append({**sp, "found": found})
+    results["check7"] = {
+        "status": "pass" if all(r["found"] for r in pp_items) else "fail",
+        "items": pp_items,
+    }
+    probe.check("check7", _count_hits(hits, "paraphrase"))
+
+    # 审核8: 必提不可修改卖点
+    fp_items = []
+    for sp in rules.fixed_selling_points:
+        found = ("fixed", sp["idx"]) in hits
+        fp_items.append({**sp, "found": found})
+    results["check8"] = {
+        "status": "pass" if all(r["found"] for r in fp_items) else "fail",
+        "items": fp_items,
+    }
+    probe.check("check8", _count_hits(hits, "fixed"))
+
+    # 审核9: 允许删减的卖点
+    op_items = []
+    for i, sp in enumerate(rules.optional_selling_points):
+        found = ("optional", i) in hits
+        op_items.append({**sp, "found": found})
+    results["check9"] = {"items": op_items}
+    probe.check("check9", _count_hits(hits, "optional"))
+
+    return results
+
+class IncrementalAuditor:
+    """按段落增量审核。
+
+    规则命中按段落内容缓存，稿件小改后只重新扫描变化的段落，再把各段命中按偏移合并，
+    与 parse_draft 的分节、标签和字数一起汇总成整篇的 check1-check9。规则短语不跨行时与
+    run_all_checks 结果一致，否则退回整篇扫描。"""
+
+    def __init__(self, max_paragraphs=4096):
+        self.max_paragraphs = max_paragraphs
+        self._cache = OrderedDict()
+
+    def _scan_paragraph(self, para, rules, probe):
+        key = (rules.fingerprint, para)
+        cached = self._cache.get(key)
+        probe.paragraph(cached is not None)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+        cached = rules.matcher.scan(para)
+        self._cache[key] = cached
+        if len(self._cache) > self.max_paragraphs:
+            self._cache.popitem(last=False)
+        return cached
+
+    def run(self, content, rules=None, metrics=None):
+        rules = rules or get_active_rules()
+        if rules.multiline_patterns:
+            return run_all_checks(content, rules, metrics)
+        probe = AuditProbe(metrics, "incremental") if metrics else NULL_PROBE
+        hits = {}
+        offset = 0
+        for para in content.split("\n"):
+            for label, positions in self._scan_paragraph(para, rules, probe).items():
+                hits.setdefault(label, []).extend(offset + p for p in positions)
+            offset += len(para) + 1
+        probe.scanned(len(content))
+        results = build_check_results(parse_draft(content), hits, rules, probe)
+        probe.done()
+        return results
+
+def apply_adopted_changes(original, adopted_map, edit_map, check_results, rules=None):
+    """根据采纳的修改建议生成修改后的文本。
+
+    所有采纳的禁词替换和标签补充基于原文一次扫描、一次拼接完成，替换结果不会再被当作新的命中。
+    返回 (修改后的文本, 变更列表)，变更的 pos / new_pos 分别为在原文 / 修改后文本中的位置，
+    补充标签的变更 new 带前导空格"""
+    rules = rules or get_active_rules()
+    edits = []
+
+    if "check6" in check_results:
+        replacements = {}
+        for i, item in enumerate(check_results["check6"]["items"]):
+            key = f"c6_{i}"
+            if adopted_map.get(key) and item["found"]:
+                replacements[item["word"]] = edit_map.get(key, item["replacement"])
+        if replacements:
+            edits.extend(find_forbidden_edits(original, replacements, rules))
+
+    if "check4" in check_results:
+        missing = check_results["check4"].get("missing", [])
+        tail = len(original.rstrip())
+        for i, tag in enumerate(missing):
+            if adopted_map.get(f"c4_{i}") and tag not in original:
+                edits.append({"pos": tail, "old": "", "new": " " + tag})
+
+    return apply_edits(original, edits)
+
+# 对比预览中两侧高亮的样式
+DIFF_STYLES = {
+    "original": "background:#c8e6c9;padding:1px 4px;border-radius:3px;font-weight:bold;",
+    "modified": "background:#f8bbd0;padding:1px 4px;border-radius:3px;font-weight:bold;",
+}
+
+def _html_text(s):
+    return html.escape(s, quote=False).replace("\n", "<br>")
+
+def highlight_diff(text, changes, mode="original"):
+    """按变更记录的偏移高亮文本，一次线性拼接出 HTML，文本做转义。
+
+    mode="original" 时 text 为原文，高亮各变更的 old（位置 pos）；
+    mode="modified" 时 text 为修改后文本，高亮各变更的 new（位置 new_pos）"""
+    if mode == "original":
+        spans = sorted((c["pos"], c["pos"] + len(c["old"])) for c in changes if c["old"])
+    else:
+        spans = sorted((c["new_pos"], c["new_pos"] + len(c["new"])) for c in changes if c["new"])
+    style = DIFF_STYLES[mode]
+    parts = []
+    cursor = 0
+    for start, end in spans:
+        if start < cursor:
+            continue
+        parts.append(_html_text(text[cursor:start]))
+        parts.append(f'<span style="{style}">{_html_text(text[start:end])}</span>')
+        cursor = end
+    parts.append(_html_text(text[cursor:]))
+    return "".join(parts)
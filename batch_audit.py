@@ -0,0 +1,144 @@
+"""批量审核：python batch_audit.py <目录或通配符>... [-o 结果.jsonl]
+
+用多进程并行解析 .docx 并运行八大审核，每篇稿件输出一行 JSON。"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+from audit import SCORED_CHECKS, count_passed, run_all_checks
+from docx_reader import read_docx
+from rule_pack import get_active_rules
+
+_worker_rules = None
+_worker_timeout = 0
+
+
+class DraftTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise DraftTimeout()
+
+
+def _init_worker(rules, timeout):
+    """进程池初始化：规则包只随 initargs 传一次，之后每个任务直接复用"""
+    global _worker_rules, _worker_timeout
+    _worker_rules = rules
+    _worker_timeout = timeout
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if timeout and hasattr(signal, "SIGALRM"):
+        signal.signal(signal.SIGALRM, _on_alarm)
+
+
+def summarize(path, results, elapsed):
+    failures = {}
+    if results["check1"]["status"] != "pass":
+        failures["check1"] = [d["category"] for d in results["check1"]["details"] if not d["found"]] or "顺序错误"
+    if results["check2"]["status"] != "pass":
+        failures["check2"] = results["check2"]["count"]
+    if results["check3"]["status"] != "pass":
+        failures["check3"] = results["check3"]["count"]
+    if results["check4"]["status"] != "pass":
+        failures["check4"] = results["check4"]["missing"] or results["check4"]["count"]
+    if results["check5"]["status"] != "pass":
+        failures["check5"] = [f'{x["scope"]}:{x["word"]}' for x in results["check5"]["items"] if not x["found"]]
+    if results["check6"]["status"] != "pass":
+        failures["check6"] = [x["word"] for x in results["check6"]["items"] if x["found"]]
+    if results["check7"]["status"] != "pass":
+        failures["check7"] = [x["idx"] for x in results["check7"]["items"] if not x["found"]]
+    if results["check8"]["status"] != "pass":
+        failures["check8"] = [x["idx"] for x in results["check8"]["items"] if not x["found"]]
+    passed = count_passed(results)
+    return {
+        "file": path, "ok": True,
+        "passed": passed, "total": len(SCORED_CHECKS), "all_passed": passed == len(SCORED_CHECKS),
+        "word_count": results["check2"]["count"],
+        "checks": {k: results[k]["status"] for k in SCORED_CHECKS},
+        "failures": failures,
+        "elapsed_ms": round(elapsed * 1000, 1),
+    }
+
+
+def audit_file(path):
+    start = time.perf_counter()
+    use_alarm = _worker_timeout and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.alarm(_worker_timeout)
+    try:
+        with open(path, "rb") as f:
+            content = read_docx(f)
+        results = run_all_checks(content, _worker_rules)
+        return summarize(path, results, time.perf_counter() - start)
+    except DraftTimeout:
+        return {"file": path, "ok": False, "error": f"超时（>{_worker_timeout}s）"}
+    except Exception as e:
+        return {"file": path, "ok": False, "error": f"{type(e).__name__}: {e}"}
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+
+
+def collect_paths(targets):
+    paths = []
+    for target in targets:
+        if os.path.isdir(target):
+            matched = glob.glob(os.path.join(target, "**", "*.docx"), recursive=True)
+        else:
+            matched = glob.glob(target, recursive=True)
+        # 跳过 Word 打开文件时生成的 ~$ 临时文件
+        paths.extend(p for p in sorted(matched) if not os.path.basename(p).startswith("~$"))
+    return list(dict.fromkeys(paths))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量运行八大审核，每篇稿件输出一行 JSON")
+    parser.add_argument("targets", nargs="+", help="稿件目录或通配符，如 drafts/ 或 'drafts/*.docx'")
+    parser.add_argument("-o", "--output", help="结果 JSONL 文件，默认输出到标准输出")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="进程数，默认等于 CPU 核数")
+    parser.add_argument("--timeout", type=int, default=60, help="单篇稿件超时秒数，0 表示不限")
+    args = parser.parse_args(argv)
+
+    paths = collect_paths(args.targets)
+    if not paths:
+        parser.error("没有找到 .docx 稿件")
+
+    rules = get_active_rules()
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    # 工作进程卡在无法被 SIGALRM 打断的地方时，主进程最多再等这么久
+    stall_limit = args.timeout * 2 + 5 if args.timeout else None
+    done = set()
+    errors = 0
+    pool = multiprocessing.Pool(min(args.workers, len(paths)), _init_worker, (rules, args.timeout))
+    try:
+        results = pool.imap_unordered(audit_file, paths)
+        for _ in paths:
+            try:
+                record = results.next(stall_limit)
+            except multiprocessing.TimeoutError:
+                break
+            done.add(record["file"])
+            errors += not record["ok"]
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+        for path in paths:
+            if path not in done:
+                errors += 1
+                out.write(json.dumps({"file": path, "ok": False, "error": "工作进程无响应，已放弃"}, ensure_ascii=False) + "\n")
+        out.flush()
+    finally:
+        pool.terminate()
+        pool.join()
+        if out is not sys.stdout:
+            out.close()
+    print(f"审核完成：{len(paths)} 篇，失败 {errors} 篇", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""基准测试用的合成稿件
+
+以规则包里的标准卖点示例为素材按句拼接正文，按需插入禁词和例外短语，
+外加标题备选和话题标签，格式与 AI 改写稿一致。同样的参数和 seed 得到同样的稿件。"""
+import random
+import re
+
+from rule_pack import get_active_rules
+
+TITLES = [
+    "适度水解防敏科普｜新手妈妈必看的选奶思路",
+    "防敏科普：适度水解奶粉到底怎么选",
+    "适度水解防敏科普来了，收藏这一篇就够",
+]
+
+# 插入禁词 / 例外短语时使用的句式
+FORBIDDEN_TEMPLATES = ["说到{}很多妈妈都会紧张。", "我以前也担心{}这件事！", "关于{}真的要多留心～"]
+EXCEPTION_TEMPLATES = ["{}这一点也要说清楚。", "很多妈妈会问{}的问题！", "提到{}我也做了功课～"]
+
+
+def _sentences(text):
+    return [s.strip() for s in re.findall(r"[^。！!；\n]+[。！!；]?", text) if s.strip()]
+
+
+def make_draft(chars, forbidden_density=0.0, exception_density=0.0, seed=0, rules=None):
+    """生成正文约 chars 个字符的稿件。
+
+    forbidden_density / exception_density: 每千字额外插入的禁词 / 例外短语个数"""
+    rules = rules or get_active_rules()
+    rng = random.Random(seed)
+    pool = _sentences(rules.selling_point_example)
+    sentences = []
+    size = 0
+    while size < chars:
+        s = rng.choice(pool)
+        sentences.append(s)
+        size += len(s)
+
+    forbidden = [w for words in rules.forbidden_words.values() for w in words]
+    exceptions = [p for phrases in rules.forbidden_exceptions.values() for p in phrases]
+    for _ in range(round(chars / 1000 * forbidden_density)):
+        s = rng.choice(FORBIDDEN_TEMPLATES).format(rng.choice(forbidden))
+        sentences.insert(rng.randrange(len(sentences) + 1), s)
+    if exceptions:
+        for _ in range(round(chars / 1000 * exception_density)):
+            s = rng.choice(EXCEPTION_TEMPLATES).format(rng.choice(exceptions))
+            sentences.insert(rng.randrange(len(sentences) + 1), s)
+
+    paragraphs = []
+    i = 0
+    while i < len(sentences):
+        n = rng.randint(3, 6)
+        paragraphs.append("".join(sentences[i:i + n]))
+        i += n
+
+    tags = list(dict.fromkeys(rules.required_tags + ["#育儿经验", "#宝宝奶粉"]))
+    return "\n".join([
+        "### 标题备选（3个）",
+        *[f"{i}. {t}" for i, t in enumerate(TITLES, 1)],
+        "",
+        "### 正文",
+        *paragraphs,
+        "",
+        "### 话题标签",
+        " ".join(tags),
+    ])
@@ -0,0 +1,166 @@
+"""审核引擎基准测试：python -m benchmarks.run [-o results.json] [--compare base.json]
+
+对不同长度的合成稿件逐个函数计时，输出吞吐（字符/秒）、p50/p99 耗时和峰值内存，
+结果存为 JSON，便于在提交之间对比回归。"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from audit import (apply_adopted_changes, auto_insert_fixed_phrases, check_forbidden_word,
+                   detect_titles, find_fixed_phrase_edits, highlight_diff, run_all_checks, scan_rules)
+from benchmarks.corpus import make_draft
+from draft import parse_draft
+from rule_pack import get_active_rules
+from textdiff import diff_changes
+
+# 约 1k 字到整本书长度
+DEFAULT_SIZES = [1000, 4000, 16000, 64000, 256000]
+
+
+def build_cases(draft, rules):
+    """准备各函数的调用参数（不计入耗时），返回 {函数名: 无参调用}"""
+    hits = scan_rules(draft, rules)
+    forbidden = [w for words in rules.forbidden_words.values() for w in words]
+    word = max(forbidden, key=lambda w: len(hits.get(("forbidden", w), [])))
+    checks = run_all_checks(draft, rules)
+    adopted = {f"c6_{i}": True for i, item in enumerate(checks["check6"]["items"]) if item["found"]}
+    adopted.update({f"c4_{i}": True for i, _ in enumerate(checks["check4"].get("missing", []))})
+    modified, changes = apply_adopted_changes(draft, adopted, {}, checks, rules)
+    cases = {
+        "run_all_checks": lambda: run_all_checks(draft, rules),
+        "check_forbidden_word": lambda: check_forbidden_word(draft, word, rules=rules),
+        "detect_titles": lambda: detect_titles(draft),
+        "auto_insert_fixed_phrases": lambda: auto_insert_fixed_phrases(draft, rules),
+        "find_fixed_phrase_edits": lambda: find_fixed_phrase_edits(draft, rules),
+        "apply_adopted_changes": lambda: apply_adopted_changes(draft, adopted, {}, checks, rules),
+        "highlight_diff": lambda: (highlight_diff(draft, changes, "original"),
+                                   highlight_diff(modified, changes, "modified")),
+        "diff_changes": lambda: diff_changes(draft, modified),
+    }
+    return {name: _uncached(fn) for name, fn in cases.items()}
+
+
+def _uncached(fn):
+    """每次调用前清空 parse_draft 的缓存，计时包含稿件解析，而不是只测到缓存命中"""
+    def call():
+        parse_draft.cache_clear()
+        return fn()
+    return call
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def measure(fn, repeat, budget):
+    """预热一次后计时，至少 3 次、至多 repeat 次，总耗时超过 budget 秒即停止；峰值内存单独跑一次。
+
+    单次就超过 budget 的（长稿上的慢函数）直接以预热那次作为唯一样本"""
+    start = time.perf_counter()
+    fn()
+    first = time.perf_counter() - start
+    if first > budget:
+        samples = [first]
+    else:
+        samples = []
+        deadline = time.perf_counter() + budget
+        while len(samples) < repeat and (len(samples) < 3 or time.perf_counter() < deadline):
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return samples, peak
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results, base_path, threshold):
+    """按 (函数, 稿件长度) 对比 p50，慢于基线 threshold 倍的标为回归，返回回归条数"""
+    with open(base_path, encoding="utf-8") as f:
+        base = {(r["function"], r["chars"]): r for r in json.load(f)["results"]}
+    regressions = 0
+    print(f"\n对比基线 {base_path}（p50 耗时比值，>{threshold} 视为回归）", file=sys.stderr)
+    for r in results:
+        old = base.get((r["function"], r["chars"]))
+        if not old:
+            continue
+        ratio = r["p50_ms"] / old["p50_ms"] if old["p50_ms"] else float("inf")
+        flag = ""
+        if ratio > threshold:
+            flag = "  ⚠️ 回归"
+            regressions += 1
+        print(f"{r['function']:<28}{r['chars']:>9}  {old['p50_ms']:>10.3f} → {r['p50_ms']:>10.3f} ms  x{ratio:.2f}{flag}",
+              file=sys.stderr)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="审核引擎基准测试")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="正文字符数，逗号分隔")
+    parser.add_argument("--forbidden-density", type=float, default=2.0, help="每千字插入的禁词个数")
+    parser.add_argument("--exception-density", type=float, default=1.0, help="每千字插入的例外短语个数")
+    parser.add_argument("--only", help="只测这些函数，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=50, help="每项最多计时次数")
+    parser.add_argument("--budget", type=float, default=2.0, help="每项计时的时间预算（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="结果 JSON 文件")
+    parser.add_argument("--compare", help="与之对比的基线结果 JSON")
+    parser.add_argument("--threshold", type=float, default=1.2, help="判定回归的 p50 比值")
+    args = parser.parse_args(argv)
+
+    rules = get_active_rules()
+    only = set(args.only.split(",")) if args.only else None
+    results = []
+    for size in [int(s) for s in args.sizes.split(",")]:
+        draft = make_draft(size, args.forbidden_density, args.exception_density, args.seed, rules)
+        for name, fn in build_cases(draft, rules).items():
+            if only and name not in only:
+                continue
+            samples, peak = measure(fn, args.repeat, args.budget)
+            p50 = percentile(samples, 50)
+            row = {
+                "function": name, "chars": len(draft), "repeats": len(samples),
+                "p50_ms": round(p50 * 1000, 3), "p99_ms": round(percentile(samples, 99) * 1000, 3),
+                "chars_per_s": round(len(draft) / p50) if p50 else None,
+                "peak_kb": round(peak / 1024, 1),
+            }
+            results.append(row)
+            print(f"{name:<28}{row['chars']:>9}  p50 {row['p50_ms']:>10.3f} ms  p99 {row['p99_ms']:>10.3f} ms  "
+                  f"{row['chars_per_s'] or 0:>12} 字符/s  峰值 {row['peak_kb']:>9} KB", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "commit": git_commit(), "time": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "rules": rules.fingerprint[:12],
+            "forbidden_density": args.forbidden_density, "exception_density": args.exception_density,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+    regressions = compare(results, args.compare, args.threshold) if args.compare else 0
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
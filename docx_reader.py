@@ -0,0 +1,65 @@
+"""Word 稿件读取
+
+直接流式解析 .docx 里的 word/document.xml，不构建 python-docx 的完整对象树。
+段落文本规则与 python-docx 的 paragraph.text 一致：只取 w:body 下的顶层段落，
+拼接段落内（含超链接内）各 run 的文字、制表符和换行。"""
+import zipfile
+from itertools import islice
+from xml.etree import ElementTree as ET
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_BODY = _W + "body"
+_P = _W + "p"
+_R = _W + "r"
+_HYPERLINK = _W + "hyperlink"
+_BR_TYPE = _W + "type"
+
+# run 内各元素对应的文字
+_RUN_TEXT = {
+    _W + "t": None,
+    _W + "tab": "\t",
+    _W + "ptab": "\t",
+    _W + "cr": "\n",
+    _W + "br": "\n",
+    _W + "noBreakHyphen": "-",
+}
+
+
+def _in_paragraph_run(path):
+    """path 为当前元素的祖先标签，判断是否位于顶层段落的 run 中"""
+    return path[-3:] == [_BODY, _P, _R] or path[-4:] == [_BODY, _P, _HYPERLINK, _R]
+
+
+def iter_docx_paragraphs(file):
+    """逐段产出正文段落文本（包括空段落）。file 为路径或可 seek 的二进制文件对象"""
+    with zipfile.ZipFile(file) as zf, zf.open("word/document.xml") as xml:
+        path = []
+        parts = []
+        body = None
+        for event, elem in ET.iterparse(xml, events=("start", "end")):
+            if event == "start":
+                path.append(elem.tag)
+                if elem.tag == _BODY:
+                    body = elem
+                continue
+            path.pop()
+            tag = elem.tag
+            if tag in _RUN_TEXT and _in_paragraph_run(path):
+                if tag == _W + "t":
+                    parts.append(elem.text or "")
+                elif tag != _W + "br" or elem.get(_BR_TYPE, "textWrapping") == "textWrapping":
+                    parts.append(_RUN_TEXT[tag])
+            elif path and path[-1] == _BODY:
+                # 顶层元素（段落、表格等）处理完即丢弃，内存占用与文档长度无关
+                if tag == _P:
+                    yield "".join(parts)
+                    parts = []
+                body.remove(elem)
+
+
+def read_docx(file, max_paragraphs=None):
+    """读取稿件正文，去掉空段落后按行拼接。max_paragraphs 用于预览，读够即停止解析"""
+    paragraphs = (text for text in iter_docx_paragraphs(file) if text.strip())
+    if max_paragraphs is not None:
+        paragraphs = islice(paragraphs, max_paragraphs)
+    return "\n".join(paragraphs)
@@ -0,0 +1,87 @@
+"""稿件解析：每个文本版本只解析一次，分节、字数、标签、标题供各项检查和页面共用（不依赖 Streamlit）"""
+import functools
+import re
+
+from sections import split_sections
+
+_CHINESE_RE = re.compile(r'[\u4e00-\u9fff]')
+_TAG_RE = re.compile(r'#[\w\u4e00-\u9fff]+')
+_NUMBERED_TITLE_RE = re.compile(r'\d+[.、．]\s*(.+)')
+_LABELED_TITLE_RE = re.compile(r'标题[：:]\s*(.+)')
+
+
+def count_chinese(text):
+    return len(_CHINESE_RE.findall(text))
+
+
+def extract_tags(content):
+    return _TAG_RE.findall(content)
+
+
+def _first_line(content):
+    for line in content.split('\n'):
+        line = line.strip()
+        if line and not line.startswith('#'):
+            return line
+    return ""
+
+
+def _detect_titles(content, sections):
+    """智能检测标题，支持多种格式"""
+    # 格式1: ### 标题备选 后面的编号列表
+    if "titles" in sections:
+        _, start, end = sections["titles"]
+        numbered = _NUMBERED_TITLE_RE.findall(content, start, end)
+        if numbered:
+            return numbered
+
+    # 格式2: 标题：后面跟内容
+    titles = _LABELED_TITLE_RE.findall(content)
+
+    # 格式3: 用户粘贴的多行标题（检测开头几行的短文本）
+    if not titles:
+        short_lines = []
+        for line in content.strip().split('\n')[:10]:
+            line = line.strip()
+            if line and len(line) < 50 and not line.startswith('#') and not line.startswith('标签'):
+                short_lines.append(line)
+            elif short_lines:
+                break
+        if len(short_lines) >= 2:
+            titles = short_lines
+
+    if not titles:
+        first_line = _first_line(content)
+        if first_line:
+            titles = [first_line]
+    return titles
+
+
+class ParsedDraft:
+    """一个稿件版本的解析结果，由 parse_draft 创建并缓存，使用方不要修改其中的字段。
+
+    sections 同 split_sections；body_start / body_end 为正文区间，没有「### 正文」小节时为整篇。
+    section_counts 为各小节的中文字数，word_count 为正文中文字数（审核2 只计正文）"""
+
+    def __init__(self, text):
+        self.text = text
+        self.sections = split_sections(text)
+        if "body" in self.sections:
+            _, self.body_start, self.body_end = self.sections["body"]
+        else:
+            self.body_start, self.body_end = 0, len(text)
+        self.section_counts = {name: count_chinese(text[start:end]) for name, (_, start, end) in self.sections.items()}
+        self.word_count = self.section_counts["body"] if "body" in self.sections else count_chinese(text)
+        self.tags = extract_tags(text)
+        self.title = _first_line(text)
+        self.titles = _detect_titles(text, self.sections)
+
+    @property
+    def body(self):
+        return self.text[self.body_start:self.body_end]
+
+
+@functools.lru_cache(maxsize=64)
+def parse_draft(text):
+    """解析稿件，同一文本只解析一次"""
+    return ParsedDraft(text)
@@ -0,0 +1,142 @@
+"""后台任务：AI 改写放进有界线程池执行，不占用页面脚本线程（不依赖 Streamlit）
+
+任务的进度和尝试记录保存在进程内而不是 session_state 里，页面重跑、刷新或关闭标签页都不会中断任务，
+页面按任务 ID 轮询，刷新后也能重新接上。"""
+import hmac
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import REGISTRY
+
+DEFAULT_WORKERS = 4
+# 排队加运行中的任务数上限为线程数的这么多倍，超出时拒绝提交
+QUEUE_FACTOR = 4
+# 已结束的任务保留这么久（秒），供页面取结果或刷新后重新接上
+KEEP_SECONDS = 3600
+
+
+class JobQueueFull(RuntimeError):
+    """进行中的任务太多，暂不接受新任务"""
+
+
+class Job:
+    """一个后台任务。status 为 queued / running / done / failed；events 为 (事件名, 数据) 进度记录。
+
+    state 是页面刷新后会话状态丢失时用来恢复的稿件等内容，info 为页面展示用的任务参数，
+    owner 为提交方的归属凭据，带同一凭据才能取到任务"""
+
+    def __init__(self, kind, state=None, info=None, owner=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.owner = owner or ""
+        self.state = dict(state or {})
+        self.info = dict(info or {})
+        self.status = "queued"
+        self.events = []
+        self.partial = ""
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def emit(self, event, data):
+        """记录一条进度，签名与 run_rewrite_loop 的 on_event 一致"""
+        with self._lock:
+            self.events.append((event, data))
+
+    def stream(self, text):
+        """记录生成中的全文，签名与 on_delta 一致"""
+        self.partial = text
+
+    def _finish(self, status, result=None, error=None):
+        with self._lock:
+            self.result = result
+            self.error = error
+            self.partial = ""
+            self.finished = time.time()
+            self.status = status
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed")
+
+    def snapshot(self):
+        """当前状态的拷贝，供页面轮询渲染"""
+        with self._lock:
+            return {
+                "id": self.id, "kind": self.kind, "status": self.status, "info": self.info,
+                "events": list(self.events), "partial": self.partial,
+                "result": self.result, "error": self.error,
+                "elapsed": (self.finished or time.time()) - self.created,
+            }
+
+
+class JobRunner:
+    """固定线程数的任务执行器，所有会话共享"""
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, metrics=None):
+        self.max_workers = max_workers
+        self.max_pending = max_workers * QUEUE_FACTOR
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="llm-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._jobs_total = self._job_seconds = None
+        if metrics is not None:
+            self._jobs_total = metrics.counter("llm_jobs_total", "后台 AI 任务数", ["kind", "status"])
+            self._job_seconds = metrics.histogram("llm_job_seconds", "后台 AI 任务从提交到结束的耗时（秒）", ["kind"],
+                                                  buckets=(1, 5, 15, 30, 60, 120, 180, 300, 600, 900))
+
+    def submit(self, kind, fn, state=None, info=None, owner=None):
+        """提交任务，fn(job) 在后台线程执行，返回值存为 job.result，抛出的异常记为 job.error。
+
+        进行中的任务达到上限时抛出 JobQueueFull"""
+        with self._lock:
+            self._prune()
+            pending = sum(1 for j in self._jobs.values() if not j.done)
+            if pending >= self.max_pending:
+                raise JobQueueFull(f"后台任务已满（{pending} 个进行中），请稍后再试")
+            job = Job(kind, state, info, owner)
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job, fn):
+        job.status = "running"
+        try:
+            job._finish("done", result=fn(job))
+        except Exception as e:
+            job._finish("failed", error=str(e) or type(e).__name__)
+        if self._jobs_total is not None:
+            self._jobs_total.inc(kind=job.kind, status=job.status)
+            self._job_seconds.observe(job.finished - job.created, kind=job.kind)
+
+    def get(self, job_id, owner=None):
+        """按 ID 取任务，不存在、已过期或 owner 与提交时不符时返回 None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or not hmac.compare_digest(job.owner, owner or ""):
+            return None
+        return job
+
+    def _prune(self):
+        cutoff = time.time() - KEEP_SECONDS
+        for job_id in [k for k, j in self._jobs.items() if j.done and j.finished < cutoff]:
+            del self._jobs[job_id]
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner():
+    """进程内共享的任务执行器，线程数由环境变量 LLM_JOB_WORKERS 指定"""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner(int(os.environ.get("LLM_JOB_WORKERS", DEFAULT_WORKERS)), metrics=REGISTRY)
+        return _runner
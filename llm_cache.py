@@ -0,0 +1,95 @@
+"""LLM 回复的磁盘缓存
+
+按 (model, temperature, messages) 的哈希存放回复文本，同一稿件重复点击生成时直接命中。
+总大小超过上限时按最近使用时间（文件 mtime，命中时刷新）淘汰最旧的条目。"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+
+class CompletionCache:
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+
+    @staticmethod
+    def make_key(model, temperature, messages, variant=0):
+        """variant 区分同一请求的多个并发候选，使它们各自缓存而不是互相覆盖"""
+        raw = json.dumps([model, temperature, messages, variant], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                text = json.load(f)["text"]
+            os.utime(path)
+            return text
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key, text):
+        path = self._path(key)
+        data = json.dumps({"text": text}, ensure_ascii=False).encode("utf-8")
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+        except OSError:
+            return
+        with self._lock:
+            # 覆盖已有条目时先减去旧文件的大小，替换和计数在同一把锁内，并发写同一 key 时不会重复计入
+            try:
+                old = os.path.getsize(path)
+            except OSError:
+                old = 0
+            try:
+                os.replace(tmp, path)
+            except OSError:
+                return
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data) - old
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """删到上限的 90%，避免每次写入都触发淘汰"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._size = total
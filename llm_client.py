@@ -0,0 +1,387 @@
+"""OpenAI 兼容接口的 LLM 客户端
+
+连接池里的 HTTP/1.1 keep-alive 连接在整个进程内复用（所有 Streamlit 会话共享），
+连接超时与读取超时分开设置；stream_chat 以 SSE 流式返回，
+achat 提供异步接口，可同时发起多个请求。
+设置 record_path（环境变量 LLM_RECORD_PATH）后，每次真实请求的回复都追加写入该 JSONL，
+供 mock_llm_server.py --replay 离线回放。
+每次调用的 token 用量优先取接口返回的 usage，没有时用本地估算；传入 metrics 时累计到计数器。"""
+import asyncio
+import functools
+import http.client
+import json
+import os
+import queue
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from llm_cache import CompletionCache
+from metrics import REGISTRY
+from tokens import estimate_prompt_tokens, estimate_tokens
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+DEFAULT_MODEL = "gpt-4o"
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".llm_cache")
+
+
+class LLMError(Exception):
+    """调用失败，消息可直接展示给用户"""
+
+
+class _CancelToken:
+    """achat 与执行 chat 的工作线程共享：记录请求正在使用的连接，取消时关闭它。
+
+    连接放回连接池之前先 detach，之后的取消不会再碰到已归还（可能已被其他请求复用）的连接"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = None
+        self.cancelled = False
+
+    def attach(self, conn):
+        """拿到连接、发出请求之前调用。已取消时返回 False，请求不再发出"""
+        with self._lock:
+            if self.cancelled:
+                return False
+            self._conn = conn
+            return True
+
+    def detach(self):
+        """连接用完、放回连接池之前调用。期间已被取消（连接可能已关闭）时返回 False，连接不要放回"""
+        with self._lock:
+            self._conn = None
+            return not self.cancelled
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            conn, self._conn = self._conn, None
+            if conn is not None and conn.sock is not None:
+                try:
+                    conn.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
+class LLMClient:
+    def __init__(self, base_url=None, api_key=None, model=DEFAULT_MODEL,
+                 connect_timeout=10, read_timeout=180, pool_size=8, cache=None, record_path=None,
+                 metrics=None):
+        url = urlsplit((base_url or DEFAULT_BASE_URL).rstrip("/"))
+        if url.scheme not in ("http", "https"):
+            raise ValueError(f"不支持的 base_url: {base_url}")
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
+        self._conn_cls = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self._host = url.hostname
+        self._port = url.port
+        self._prefix = url.path
+        self.api_key = api_key
+        self.model = model
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.cache = cache
+        self.record_path = record_path
+        self._record_lock = threading.Lock()
+        self._tokens = metrics.counter("llm_tokens_total", "LLM token 用量",
+                                       ["kind", "source"]) if metrics else None
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._executor_workers = pool_size * 2
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    # ---------- 连接池 ----------
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait(), True
+        except queue.Empty:
+            conn = self._conn_cls(self._host, self._port, timeout=self.connect_timeout)
+            conn.connect()
+            conn.sock.settimeout(self.read_timeout)
+            return conn, False
+
+    def _release(self, conn):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _get_executor(self):
+        """achat 使用的线程池，首次使用（或 close 之后再次使用）时创建"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._executor_workers, thread_name_prefix="llm")
+            return self._executor
+
+    def close(self):
+        """关闭空闲连接并停掉 achat 的线程池，正在进行的请求不受影响"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    # ---------- 请求 ----------
+    def _headers(self):
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def _send(self, path, payload, cancel=None):
+        """发送 POST 并拿到响应头，返回 (连接, 响应)。复用的连接已被服务端关闭时换新连接重试一次。
+
+        cancel 为 _CancelToken，拿到连接时已取消则不发请求，抛出 LLMError"""
+        body = json.dumps(payload).encode("utf-8")
+        for attempt in range(2):
+            try:
+                conn, reused = self._acquire()
+            except socket.timeout:
+                raise LLMError("连接超时")
+            except OSError as e:
+                raise LLMError(f"网络连接失败 - {e}")
+            if cancel is not None and not cancel.attach(conn):
+                self._release(conn)
+                raise LLMError("请求已取消")
+            try:
+                conn.request("POST", self._prefix + path, body=body, headers=self._headers())
+                return conn, conn.getresponse()
+            except socket.timeout:
+                conn.close()
+                raise LLMError(f"读取超时（>{self.read_timeout}s）")
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                conn.close()
+                if reused and attempt == 0:
+                    continue
+                raise LLMError(f"网络连接失败 - {e}")
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                raise LLMError(f"网络连接失败 - {e}")
+
+    def _post(self, path, payload, cancel=None):
+        """发送 POST 并读完响应，返回 (状态码, 响应体)"""
+        conn, resp = self._send(path, payload, cancel)
+        try:
+            data = resp.read()
+        except socket.timeout:
+            conn.close()
+            raise LLMError(f"读取超时（>{self.read_timeout}s）")
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            raise LLMError(f"网络连接失败 - {e}")
+        live = cancel is None or cancel.detach()
+        if resp.will_close or not live:
+            conn.close()
+        else:
+            self._release(conn)
+        return resp.status, data
+
+    def _payload(self, messages, model, temperature, max_tokens):
+        return {
+            "model": model or self.model,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "messages": messages,
+        }
+
+    def _cache_key(self, messages, model, temperature, variant):
+        if self.cache is None:
+            return None
+        return self.cache.make_key(model or self.model, temperature, messages, variant)
+
+    def _record(self, payload, content):
+        """录制一次请求与回复，key 与模拟服务回放时计算的哈希一致"""
+        if not self.record_path:
+            return
+        record = {
+            "key": CompletionCache.make_key(payload["model"], payload["temperature"], payload["messages"]),
+            "model": payload["model"],
+            "temperature": payload["temperature"],
+            "messages": payload["messages"],
+            "response": content,
+        }
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._record_lock:
+            try:
+                with open(self.record_path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError:
+                pass
+
+    def _account(self, messages, content, reported, usage, source):
+        """整理一次调用的 token 用量写入 usage（调用方传入的字典），并累计到指标。
+
+        reported 为接口返回的 usage 字段；source 为 api（真实请求）或 cache（命中本地回复缓存，未请求）"""
+        if reported and source == "api":
+            details = reported.get("prompt_tokens_details") or {}
+            record = {
+                "prompt_tokens": reported.get("prompt_tokens", 0),
+                "completion_tokens": reported.get("completion_tokens", 0),
+                "cached_tokens": details.get("cached_tokens") or 0,
+                "estimated": False,
+            }
+        else:
+            record = {
+                "prompt_tokens": estimate_prompt_tokens(messages),
+                "completion_tokens": estimate_tokens(content),
+                "cached_tokens": 0,
+                "estimated": True,
+            }
+            if source == "api":
+                source = "estimate"
+        record["source"] = source
+        if usage is not None:
+            usage.update(record)
+        if self._tokens:
+            self._tokens.inc(record["prompt_tokens"] - record["cached_tokens"], kind="prompt", source=source)
+            self._tokens.inc(record["cached_tokens"], kind="cached_prompt", source=source)
+            self._tokens.inc(record["completion_tokens"], kind="completion", source=source)
+
+    def chat(self, messages, model=None, temperature=0.7, max_tokens=4000,
+             use_cache=True, variant=0, usage=None, _cancel=None):
+        """同步调用 chat/completions，返回回复文本，失败抛出 LLMError。
+
+        use_cache=False 时跳过缓存读取（用于主动重新生成），新结果仍会写入缓存。
+        传入字典 usage 时写入本次的 prompt_tokens / completion_tokens / cached_tokens / estimated / source"""
+        key = self._cache_key(messages, model, temperature, variant)
+        if key and use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._account(messages, cached, None, usage, "cache")
+                return cached
+        payload = self._payload(messages, model, temperature, max_tokens)
+        status, data = self._post("/chat/completions", payload, _cancel)
+        text = data.decode("utf-8", errors="replace")
+        if status != 200:
+            raise LLMError(f"HTTP {status} - {text[:200]}")
+        try:
+            body = json.loads(text)
+            content = body["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError, TypeError):
+            raise LLMError(f"无法解析的响应 - {text[:200]}")
+        self._account(messages, content, body.get("usage"), usage, "api")
+        self._record(payload, content)
+        if key:
+            self.cache.put(key, content)
+        return content
+
+    def stream_chat(self, messages, model=None, temperature=0.7, max_tokens=4000,
+                    use_cache=True, variant=0, usage=None):
+        """流式调用（stream: true），逐块产出新增文本，失败抛出 LLMError。缓存命中时一次产出全文。
+
+        usage 同 chat，在生成器读完后写入"""
+        key = self._cache_key(messages, model, temperature, variant)
+        if key and use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._account(messages, cached, None, usage, "cache")
+                yield cached
+                return
+        payload = self._payload(messages, model, temperature, max_tokens)
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}
+        conn, resp = self._send("/chat/completions", payload)
+        finished = False
+        try:
+            if resp.status != 200:
+                text = resp.read().decode("utf-8", errors="replace")
+                raise LLMError(f"HTTP {resp.status} - {text[:200]}")
+            parts = []
+            reported = {}
+            for delta in _iter_sse_deltas(resp, reported):
+                parts.append(delta)
+                yield delta
+            resp.read()
+            finished = True
+            content = "".join(parts)
+            self._account(messages, content, reported.get("usage"), usage, "api")
+            self._record(payload, content)
+            if key:
+                self.cache.put(key, content)
+        except socket.timeout:
+            raise LLMError(f"读取超时（>{self.read_timeout}s）")
+        except (OSError, http.client.HTTPException) as e:
+            raise LLMError(f"网络连接失败 - {e}")
+        finally:
+            # 中途放弃（包括调用方提前关闭生成器）的连接状态不确定，不放回连接池
+            if finished and not resp.will_close:
+                self._release(conn)
+            else:
+                conn.close()
+
+    async def achat(self, messages, **kwargs):
+        """异步版 chat。任务被取消时关闭底层连接，服务端随即停止生成；
+        还没拿到连接的请求不再发出"""
+        cancel = _CancelToken()
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self.chat, messages, _cancel=cancel, **kwargs)
+        try:
+            return await loop.run_in_executor(self._get_executor(), call)
+        except asyncio.CancelledError:
+            cancel.cancel()
+            raise
+
+
+def _iter_sse_deltas(resp, reported=None):
+    """解析 server-sent events，产出每个 chunk 的 delta.content，遇到 [DONE] 结束。
+
+    传入字典 reported 时，把最后一个 chunk 带的 usage 存到 reported["usage"]"""
+    while True:
+        line = resp.readline()
+        if not line:
+            return
+        line = line.strip()
+        if not line.startswith(b"data:"):
+            continue
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            return
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            continue
+        if "error" in chunk:
+            raise LLMError(f"流式响应错误 - {str(chunk['error'])[:200]}")
+        if reported is not None and chunk.get("usage"):
+            reported["usage"] = chunk["usage"]
+        for choice in chunk.get("choices") or []:
+            content = (choice.get("delta") or {}).get("content")
+            if content:
+                yield content
+
+
+# ========== 进程内共享的客户端 ==========
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """按环境变量返回共享客户端；相关环境变量变化时重建。LLM_CACHE_DIR 设为空串可关闭回复缓存，
+    LLM_RECORD_PATH 非空时录制所有真实回复"""
+    global _client, _client_key
+    key = (
+        os.environ.get("OPENAI_BASE_URL", DEFAULT_BASE_URL),
+        os.environ.get("OPENAI_API_KEY"),
+        os.environ.get("LLM_MODEL", DEFAULT_MODEL),
+        float(os.environ.get("LLM_CONNECT_TIMEOUT", 10)),
+        float(os.environ.get("LLM_READ_TIMEOUT", 180)),
+        os.environ.get("LLM_CACHE_DIR", DEFAULT_CACHE_DIR),
+        float(os.environ.get("LLM_CACHE_MAX_MB", 200)),
+        os.environ.get("LLM_RECORD_PATH") or None,
+    )
+    with _client_lock:
+        if _client is None or key != _client_key:
+            if _client is not None:
+                _client.close()
+            base_url, api_key, model, connect_timeout, read_timeout, cache_dir, cache_mb, record_path = key
+            cache = CompletionCache(cache_dir, int(cache_mb * 1024 * 1024)) if cache_dir else None
+            _client = LLMClient(base_url, api_key, model, connect_timeout, read_timeout,
+                                cache=cache, record_path=record_path, metrics=REGISTRY)
+            _client_key = key
+        return _client
@@ -0,0 +1,177 @@
+"""本地确定性修正：不需要 AI 生成就能修好的问题先在本地修掉（不依赖 Streamlit）
+
+- 审核6：有固定替换词的禁词直接替换（例外短语中的不动）
+- 审核4/5：补上缺失的必含标签，标签不足10个或关键词缺失时补关键词标签
+- 审核8：只差几个字的不可修改话术就地还原为原文，仍缺失的再补上
+- 审核2：字数超出上限时删掉可删减卖点所在的分句和重复的语气词
+
+字数不足、卖点顺序（审核1）、标题（审核3）等仍需 AI 重写。"""
+import re
+
+from audit import (SCORED_CHECKS, WORD_COUNT_RANGE, apply_edits, auto_insert_fixed_phrases, find_fixed_phrase_edits,
+                   replace_forbidden_words, run_all_checks)
+from draft import count_chinese, parse_draft
+from rule_pack import get_active_rules
+from sections import section_text, splice_sections
+
+
+def add_missing_tags(content, rules=None):
+    """把缺失的标签补进话题标签小节（没有该小节时追加在末尾），返回 (新文本, 补充的标签)"""
+    rules = rules or get_active_rules()
+    draft = parse_draft(content)
+    tags = draft.tags
+    added = [t for t in rules.required_tags if t not in tags]
+    text = content + " " + " ".join(added)
+    keywords = dict.fromkeys(rules.body_keywords + rules.cover_keywords + rules.title_keywords)
+    for w in keywords:
+        tag = f"#{w}"
+        if tag in tags or tag in added:
+            continue
+        if w not in text or len(tags) + len(added) < 10:
+            added.append(tag)
+    if not added:
+        return content, []
+    if "tags" in draft.sections:
+        current = section_text(content, draft.sections, "tags")
+        return splice_sections(content, {"tags": (current + " " + " ".join(added)).strip()}), added
+    return content.rstrip() + "\n" + " ".join(added), added
+
+
+# 正文里第二次起出现可以直接删掉的语气词，连同紧跟的标点；只删分句开头的，避免拆开「名副其实」这类词
+INTERJECTIONS = ["说实话", "说真的", "不瞒你说", "姐妹们", "真的", "其实", "简直", "真心"]
+_INTERJECTION_RE = re.compile("(?<![\u4e00-\u9fff])(?:" + "|".join(INTERJECTIONS) + ")[，,！!～~]?")
+_SENTENCE_END = "。！？!?\n"
+_CLAUSE_END = "，；,;"
+
+
+def _find_all(text, phrase, start, end):
+    pos = text.find(phrase, start, end)
+    while pos != -1:
+        yield pos
+        pos = text.find(phrase, pos + 1, end)
+
+
+def _protected_phrases(rules):
+    """删减时不能碰的短语：不可修改话术、必提卖点、关键词、卖点锚点和禁词例外短语"""
+    phrases = [sp["text"] for sp in rules.fixed_selling_points]
+    phrases += [sp["fragment"] for sp in rules.paraphrase_selling_points]
+    phrases += rules.body_keywords + rules.cover_keywords + rules.title_keywords
+    for anchors in rules.order_anchors.values():
+        phrases += anchors
+    for exceptions in rules.forbidden_exceptions.values():
+        phrases += exceptions
+    return dict.fromkeys(phrases)
+
+
+def _sentence_span(text, pos, start, end):
+    """text[start:end] 中包含 pos 的整句（含句末标点），整行都是这一句时连同换行一起"""
+    s = pos
+    while s > start and text[s - 1] not in _SENTENCE_END:
+        s -= 1
+    e = pos
+    while e < end and text[e] not in _SENTENCE_END:
+        e += 1
+    while e < end and text[e] in "。！？!?":
+        e += 1
+    if (s == start or text[s - 1] == "\n") and e < end and text[e] == "\n":
+        e += 1
+    return s, e
+
+
+def _clause_span(text, pos, start, end):
+    """包含 pos 的分句（按「，；」切分）连同一个相邻的分隔符；句中只有这一个分句时为整句"""
+    s, e = _sentence_span(text, pos, start, end)
+    cs = pos
+    while cs > s and text[cs - 1] not in _CLAUSE_END:
+        cs -= 1
+    ce = pos
+    while ce < e and text[ce] not in _CLAUSE_END + _SENTENCE_END:
+        ce += 1
+    if ce < e and text[ce] in _CLAUSE_END:
+        return cs, ce + 1
+    if cs > s:
+        return cs - 1, ce
+    return s, e
+
+
+def trim_to_length(content, rules=None):
+    """正文字数超过审核2上限时在正文内本地删减，返回 (新文本, 删除记录)，删除记录格式同 apply_edits。
+
+    依次删除可删减卖点所在的整句（句中有不能动的内容时只删所在分句）、第二次起出现的语气词，
+    够数即停且不会删到下限以下；
+    不可修改话术、必提卖点、关键词、卖点锚点和标签所在处不动。
+    删完后除审核2外原本通过的检查若有变为不通过，放弃删减返回原文"""
+    rules = rules or get_active_rules()
+    lo, hi = WORD_COUNT_RANGE
+    draft = parse_draft(content)
+    count = draft.word_count
+    if count <= hi:
+        return content, []
+    start, end = draft.body_start, draft.body_end
+
+    protected = [(p, p + len(phrase)) for phrase in _protected_phrases(rules)
+                 for p in _find_all(content, phrase, start, end)]
+    protected.extend(m.span() for m in re.finditer(r"#\S+", content))
+
+    # 每个候选是按优先顺序排列的几种删法，取第一种不碰受保护内容、也不会删过头的
+    candidates = []
+    for sp in rules.optional_selling_points:
+        for p in _find_all(content, sp["fragment"], start, end):
+            candidates.append([_sentence_span(content, p, start, end), _clause_span(content, p, start, end)])
+    seen = set()
+    for m in _INTERJECTION_RE.finditer(content, start, end):
+        word = m.group(0).rstrip("，,！!～~")
+        if word in seen:
+            candidates.append([m.span()])
+        seen.add(word)
+
+    edits = []
+    taken = []
+    for options in candidates:
+        if count <= hi:
+            break
+        for s, e in options:
+            cost = count_chinese(content[s:e])
+            if count - cost >= lo and not any(ps < e and s < pe for ps, pe in protected + taken):
+                taken.append((s, e))
+                edits.append({"pos": s, "old": content[s:e], "new": ""})
+                count -= cost
+                break
+    if not edits:
+        return content, []
+    text, removed = apply_edits(content, edits)
+    before, after = run_all_checks(content, rules), run_all_checks(text, rules)
+    if any(before[k]["status"] == "pass" and after[k]["status"] != "pass" for k in SCORED_CHECKS if k != "check2"):
+        return content, []
+    return text, removed
+
+
+def apply_local_fixes(content, rules=None):
+    """依次做禁词替换、还原近似话术、补标签、补不可修改话术、超长删减，返回 (新文本, 修正记录)。
+
+    修正记录 inserted 中的 pos 已按删减平移，对新文本有效"""
+    rules = rules or get_active_rules()
+    content, replaced = replace_forbidden_words(content, rules.forbidden_replacements, rules)
+    content, restored = apply_edits(content, find_fixed_phrase_edits(content, rules))
+    content, tags = add_missing_tags(content, rules)
+    content, inserted = auto_insert_fixed_phrases(content, rules)
+    content, trimmed = trim_to_length(content, rules)
+    for rec in inserted:
+        rec["pos"] -= sum(len(c["old"]) for c in trimmed if c["pos"] < rec["pos"])
+    return content, {"replaced": replaced, "restored": restored, "tags": tags, "inserted": inserted, "trimmed": trimmed}
+
+
+def describe_fixes(fixes):
+    """修正记录的一句话说明，没有修正时返回空字符串"""
+    parts = []
+    if fixes["replaced"]:
+        parts.append(f"替换禁词{len(fixes['replaced'])}处")
+    if fixes.get("restored"):
+        parts.append(f"还原话术{len(fixes['restored'])}处")
+    if fixes["tags"]:
+        parts.append(f"补充标签{len(fixes['tags'])}个（{' '.join(fixes['tags'])}）")
+    if fixes["inserted"]:
+        parts.append(f"补充话术{len(fixes['inserted'])}条")
+    if fixes.get("trimmed"):
+        parts.append(f"精简{sum(count_chinese(c['old']) for c in fixes['trimmed'])}字")
+    return "、".join(parts)
@@ -0,0 +1,127 @@
+"""人话修改循环的离线压测：python loop_bench.py [--runs 20] [--latency 1] [--error-rate 0.1] ...
+
+默认在进程内启动 mock_llm_server，重复跑 run_rewrite_loop，统计端到端耗时、尝试轮数和通过率；
+指定 --base-url 时改为请求已有服务（例如配合 LLM_RECORD_PATH 录制真实回复）。"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+from audit import SCORED_CHECKS, IncrementalAuditor, count_passed
+from docx_reader import read_docx
+from llm_client import LLMClient
+from mock_llm_server import add_server_arguments, server_options, start_server
+from rewrite import run_rewrite_loop
+from rule_pack import get_active_rules
+
+# 未指定 --draft 时使用的原稿
+SAMPLE_DRAFT = """作为育婴师，经常有妈妈问我宝宝过敏怎么办。
+新生儿的肠胃很娇嫩，第一口奶粉一定要选对。
+我推荐能恩全护，采用雀巢尖峰水解技术，还有6种HMO和双菌，营养也很全面。"""
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[idx]
+
+
+def load_draft(path):
+    if not path:
+        return SAMPLE_DRAFT
+    if path.endswith(".docx"):
+        return read_docx(path)
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def run_once(content, client, rules, args):
+    on_delta = (lambda text: None) if args.stream else None
+    start = time.perf_counter()
+    out = run_rewrite_loop(content, client, rules, IncrementalAuditor(), args.max_retries,
+                           args.candidates, use_cache=False, section_repair=not args.no_section_repair,
+                           on_delta=on_delta)
+    return {
+        "elapsed_s": round(time.perf_counter() - start, 3),
+        "attempts": out["attempts"],
+        "passed": out["passed"],
+        "checks_passed": count_passed(out["checks"]) if out["checks"] else 0,
+        "error": out["error"],
+        "usage": out["usage"],
+    }
+
+
+def summarize(runs):
+    elapsed = [r["elapsed_s"] for r in runs]
+    ok = [r for r in runs if not r["error"]]
+    return {
+        "runs": len(runs),
+        "pass_rate": round(sum(r["passed"] for r in runs) / len(runs), 3),
+        "error_rate": round(sum(bool(r["error"]) for r in runs) / len(runs), 3),
+        "mean_attempts": round(statistics.mean(r["attempts"] for r in runs), 2),
+        "mean_attempts_ok": round(statistics.mean(r["attempts"] for r in ok), 2) if ok else None,
+        "latency_p50_s": percentile(elapsed, 50),
+        "latency_p95_s": percentile(elapsed, 95),
+        "latency_max_s": max(elapsed),
+        "mean_prompt_tokens": round(statistics.mean(r["usage"]["prompt_tokens"] for r in runs)),
+        "mean_cached_tokens": round(statistics.mean(r["usage"]["cached_tokens"] for r in runs)),
+        "mean_completion_tokens": round(statistics.mean(r["usage"]["completion_tokens"] for r in runs)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="人话修改循环的离线压测")
+    parser.add_argument("--runs", type=int, default=20, help="循环次数")
+    parser.add_argument("--draft", help="原稿文件（.docx 或纯文本），默认使用内置示例")
+    parser.add_argument("--max-retries", type=int, default=5, help="每次循环的最大尝试轮数")
+    parser.add_argument("--candidates", type=int, default=1, help="每轮并发候选数")
+    parser.add_argument("--stream", action="store_true", help="走流式接口（仅 candidates=1 时生效）")
+    parser.add_argument("--no-section-repair", action="store_true", help="修正轮次总是整篇重写（用于对比）")
+    parser.add_argument("--base-url", help="请求已有服务而不启动内置模拟服务")
+    parser.add_argument("--model", default=os.environ.get("LLM_MODEL", "gpt-4o"))
+    parser.add_argument("-o", "--output", help="结果 JSON 文件，默认输出到标准输出")
+    add_server_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.base_url:
+        base_url = args.base_url
+    else:
+        server = start_server(**server_options(args))
+        base_url = server.base_url
+    client = LLMClient(base_url, os.environ.get("OPENAI_API_KEY", "mock"), args.model,
+                       record_path=os.environ.get("LLM_RECORD_PATH") or None)
+    rules = get_active_rules()
+    content = load_draft(args.draft)
+
+    runs = []
+    try:
+        for i in range(args.runs):
+            run = run_once(content, client, rules, args)
+            runs.append(run)
+            status = "通过" if run["passed"] else run["error"] or f"{run['checks_passed']}/{len(SCORED_CHECKS)}"
+            print(f"[{i + 1}/{args.runs}] {run['elapsed_s']}s 尝试{run['attempts']}轮 {status}", file=sys.stderr)
+    finally:
+        client.close()
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    report = {"config": vars(args), "summary": summarize(runs), "runs": runs}
+    if server is not None:
+        report["server"] = server.stats
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
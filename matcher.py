@@ -0,0 +1,128 @@
+"""多模式匹配：Aho-Corasick 自动机，一次扫描找出所有规则命中；另有单模式的近似匹配"""
+from collections import deque
+
+
+class MultiPatternMatcher:
+    """把一组 (模式串, 标签) 编译成自动机，scan 时只走一遍文本。
+
+    同一个模式串可以挂多个标签（例如「适度水解」同时是标题和正文关键词），
+    命中会按标签分别返回。"""
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for pattern, label in patterns:
+            if pattern:
+                self._add(pattern, label)
+        self._build()
+
+    def _add(self, pattern, label):
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(pattern), label))
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter_matches(self, text):
+        """逐个产出 (起始位置, 模式长度, 标签)，包括重叠命中，按结束位置排序"""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                end = i + 1
+                for length, label in out[node]:
+                    yield end - length, length, label
+
+    def scan(self, text):
+        """返回 {标签: [起始位置, ...]}，位置按升序排列"""
+        hits = {}
+        for start, _, label in self.iter_matches(text):
+            hits.setdefault(label, []).append(start)
+        for positions in hits.values():
+            positions.sort()
+        return hits
+
+
+def _edit_distance_prefix(pattern, window):
+    """pattern 与 window 某个前缀的最小编辑距离，返回 (距离, 该前缀长度)，同距离取最长的前缀"""
+    prev = list(range(len(window) + 1))
+    for i, pc in enumerate(pattern, 1):
+        cur = [i]
+        for j, tc in enumerate(window, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (pc != tc)))
+        prev = cur
+    best = min(prev)
+    return best, max(j for j, d in enumerate(prev) if d == best)
+
+
+def approx_search(pattern, text, max_edits, start=0, end=None):
+    """在 text[start:end] 中找与 pattern 编辑距离不超过 max_edits 的片段（Myers 位并行算法，一遍扫描）。
+
+    每一段连续命中的结束位置取距离最小的一个，再反向求出起点；返回不重叠的 [(起点, 终点, 距离)]"""
+    m = len(pattern)
+    if not m:
+        return []
+    end = len(text) if end is None else end
+    peq = {}
+    for i, ch in enumerate(pattern):
+        peq[ch] = peq.get(ch, 0) | (1 << i)
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv, mv, score = mask, 0, m
+    ends = []
+    best = None
+    for j in range(start, end):
+        eq = peq.get(text[j], 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = (mv | ~(xh | pv)) & mask
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = (ph << 1) & mask
+        mh = (mh << 1) & mask
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv
+        if score <= max_edits:
+            if best is None or score < best[1]:
+                best = (j + 1, score)
+        elif best is not None:
+            ends.append(best)
+            best = None
+    if best is not None:
+        ends.append(best)
+
+    found = []
+    for e, _ in ends:
+        lo = max(start, e - m - max_edits)
+        if found and lo < found[-1][1]:
+            lo = found[-1][1]
+        window = text[lo:e][::-1]
+        dist, length = _edit_distance_prefix(pattern[::-1], window)
+        if dist <= max_edits and length:
+            found.append((e - length, e, dist))
+    return found
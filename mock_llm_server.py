@@ -0,0 +1,270 @@
+"""本地 OpenAI 兼容的模拟 LLM 服务，用于离线测试和压测人话修改循环
+
+python mock_llm_server.py --port 8001 --latency 2 --error-rate 0.1 --forbidden-rate 0.3
+OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=mock streamlit run app.py
+
+--replay 指定录制文件（LLM_RECORD_PATH 录下的 JSONL）时按请求哈希回放真实回复，
+未录到的请求才返回按规则包合成的稿件。
+回复带 usage（本地估算），并模拟服务端前缀缓存：与近期请求相同的前缀计入 cached_tokens。"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from draft import count_chinese
+from llm_cache import CompletionCache
+from rule_pack import get_active_rules
+from tokens import common_prefix_tokens, estimate_prompt_tokens, estimate_tokens
+
+# 模拟前缀缓存：提示词不少于这么多 token 才缓存，按块对齐，只和最近若干个请求比较
+PREFIX_CACHE_MIN_TOKENS = 1024
+PREFIX_CACHE_BLOCK = 128
+PREFIX_CACHE_RECENT = 32
+
+# 合成稿件用的口语化短句，不含任何禁词
+FILLER_LINES = [
+    "姐妹们真的听我一句！", "咱家娃喝了以后状态稳稳的～", "这个细节我真的很在意💡",
+    "选对奶粉真的省心太多了✨", "说实话一开始我也纠结过", "每次冲奶都觉得很安心",
+    "宝宝喝完睡得也香香的", "身边宝妈问了我好几次", "真心建议新手爸妈收藏",
+    "踩过坑才知道选对有多重要🔥", "我自己对比了好久才定下来", "喝了一段时间真的能感觉到变化",
+]
+
+
+def synth_completion(rules, rng, forbidden_rate=0.0, drop_rate=0.0):
+    """按规则包合成一篇格式完整的改写稿，默认八大审核全部通过。
+
+    forbidden_rate: 插入一句含禁词句子的概率；drop_rate: 每条不可修改话术被漏掉的概率"""
+    titles = [
+        "适度水解防敏科普｜新手妈妈必看的选奶思路",
+        "适度水解防敏科普：我家娃的第一口奶粉这样选",
+        "防敏科普来了！适度水解到底怎么选",
+    ]
+    lines = ["姐妹们！作为育婴师我真的要聊聊能恩全护，适度水解和防敏这件事太重要了！"]
+    by_cat = {}
+    for sp in rules.paraphrase_selling_points:
+        by_cat.setdefault(sp["category"], []).append(sp["text"])
+    for sp in rules.fixed_selling_points:
+        if rng.random() >= drop_rate:
+            by_cat.setdefault(sp["category"], []).append(sp["text"])
+    for cat in [c for c in by_cat if c not in rules.order_anchors] + list(rules.order_anchors):
+        for text in by_cat.get(cat, []):
+            lines.append(text + "！")
+    if rng.random() < forbidden_rate:
+        word = rng.choice([w for words in rules.forbidden_words.values() for w in words])
+        lines.insert(rng.randrange(1, len(lines)), f"说实话{word}这件事我以前真没在意。")
+    lines.append("想带娃放心玩，选对奶粉很关键！有同款宝宝的妈妈评论区举手🙋‍♀️")
+
+    extra_tags = ["#育儿经验", "#宝宝奶粉", "#新手妈妈"]
+    tags = list(dict.fromkeys(rules.required_tags + extra_tags))
+
+    def render():
+        return "\n".join([
+            "### 标题备选（3个）",
+            *[f"{i}. {t}" for i, t in enumerate(titles, 1)],
+            "",
+            "### 正文",
+            "\n".join(lines),
+            "",
+            "### 话题标签",
+            " ".join(tags),
+        ])
+
+    target = rng.randint(820, 880)
+    while count_chinese("\n".join(lines)) < target:
+        lines.insert(rng.randrange(1, len(lines)), rng.choice(FILLER_LINES))
+    return render()
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, jitter=0.0, error_rate=0.0, forbidden_rate=0.0,
+                 drop_rate=0.0, replay=None, seed=0, chunk_size=20):
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.forbidden_rate = forbidden_rate
+        self.drop_rate = drop_rate
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.recordings = load_recordings(replay) if replay else {}
+        self.rules = get_active_rules()
+        self.stats = {"requests": 0, "errors": 0, "replayed": 0, "synthetic": 0, "prompt_chars": 0,
+                      "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+        self._seen = {}
+        self._recent = deque(maxlen=PREFIX_CACHE_RECENT)
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def next_reply(self, request):
+        """返回 (HTTP 状态码, 回复文本或错误信息, 总延迟)。
+
+        随机数由 (seed, 请求哈希, 该请求第几次出现) 决定，同样的请求序列得到同样的结果"""
+        key = CompletionCache.make_key(request.get("model"), request.get("temperature"), request.get("messages"))
+        with self._lock:
+            n = self._seen.get(key, 0)
+            self._seen[key] = n + 1
+            self.stats["requests"] += 1
+            self.stats["prompt_chars"] += sum(len(m.get("content") or "") for m in request.get("messages") or [])
+        rng = random.Random(f"{self.seed}:{key}:{n}")
+        delay = max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter))
+        if rng.random() < self.error_rate:
+            with self._lock:
+                self.stats["errors"] += 1
+            status = rng.choice([429, 500])
+            message = "Rate limit reached" if status == 429 else "Internal server error"
+            return status, message, delay
+        replies = self.recordings.get(key)
+        with self._lock:
+            self.stats["replayed" if replies else "synthetic"] += 1
+        if replies:
+            return 200, replies[n % len(replies)], delay
+        return 200, synth_completion(self.rules, rng, self.forbidden_rate, self.drop_rate), delay
+
+
+    def usage(self, request, text):
+        """本次回复的 usage；cached_tokens 为与近期请求的最长公共前缀（按块向下取整）"""
+        messages = request.get("messages") or []
+        prompt = estimate_prompt_tokens(messages)
+        with self._lock:
+            cached = max((common_prefix_tokens(messages, m) for m in self._recent), default=0)
+            self._recent.append(messages)
+        cached = min(cached, prompt) // PREFIX_CACHE_BLOCK * PREFIX_CACHE_BLOCK if prompt >= PREFIX_CACHE_MIN_TOKENS else 0
+        completion = estimate_tokens(text)
+        with self._lock:
+            self.stats["prompt_tokens"] += prompt
+            self.stats["cached_tokens"] += cached
+            self.stats["completion_tokens"] += completion
+        return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion,
+                "prompt_tokens_details": {"cached_tokens": cached}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, obj):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def do_POST(self):
+        try:
+            self._handle_post()
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端中途取消（并发候选的落选者、achat 被取消）时连接已断开，直接关闭，不打印堆栈
+            self.close_connection = True
+
+    def _handle_post(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid JSON"}})
+            return
+        status, text, delay = self.server.next_reply(request)
+        if status != 200:
+            time.sleep(min(delay, 0.05))
+            self._send_json(status, {"error": {"message": text, "code": status}})
+            return
+        model = request.get("model", "mock")
+        usage = self.server.usage(request, text)
+        if not request.get("stream"):
+            time.sleep(delay)
+            self._send_json(200, {
+                "id": "mock", "object": "chat.completion", "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        pieces = [text[i:i + self.server.chunk_size] for i in range(0, len(text), self.server.chunk_size)] or [""]
+        pause = delay / len(pieces)
+        for piece in pieces:
+            time.sleep(pause)
+            chunk = {"id": "mock", "object": "chat.completion.chunk", "model": model,
+                     "choices": [{"index": 0, "delta": {"content": piece}}]}
+            self._write_chunk(b"data: " + json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n\n")
+        if (request.get("stream_options") or {}).get("include_usage"):
+            chunk = {"id": "mock", "object": "chat.completion.chunk", "model": model, "choices": [], "usage": usage}
+            self._write_chunk(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+        self._write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def load_recordings(path):
+    """读取录制文件，返回 {请求哈希: [回复, ...]}；同一请求录到多次时按顺序轮流回放"""
+    recordings = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                rec = json.loads(line)
+                recordings.setdefault(rec["key"], []).append(rec["response"])
+    return recordings
+
+
+def start_server(host="127.0.0.1", port=0, **options):
+    """在后台线程启动服务，返回 MockLLMServer（port=0 时自动分配端口）"""
+    server = MockLLMServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_server_arguments(parser):
+    parser.add_argument("--latency", type=float, default=0.0, help="每次回复的平均耗时（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="耗时随机浮动范围（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 HTTP 429/500 的概率")
+    parser.add_argument("--forbidden-rate", type=float, default=0.0, help="合成稿件中插入禁词的概率")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="合成稿件漏掉每条不可修改话术的概率")
+    parser.add_argument("--replay", help="按请求哈希回放的录制文件（JSONL）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+
+
+def server_options(args):
+    return {
+        "latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate,
+        "forbidden_rate": args.forbidden_rate, "drop_rate": args.drop_rate,
+        "replay": args.replay, "seed": args.seed,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容的模拟 LLM 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    add_server_arguments(parser)
+    args = parser.parse_args(argv)
+    server = MockLLMServer((args.host, args.port), **server_options(args))
+    print(f"模拟 LLM 服务已启动：OPENAI_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""人话修改：提示词与「生成 → 自动补话术 → 八大审核」循环（不依赖 Streamlit）"""
+import asyncio
+import functools
+import threading
+from collections import OrderedDict
+
+from audit import SCORED_CHECKS, WORD_COUNT_RANGE, count_passed, run_all_checks
+from draft import parse_draft
+from llm_client import LLMError
+from local_fix import apply_local_fixes
+from rule_pack import get_active_rules
+from sections import SECTION_TITLES, section_of, section_text, splice_sections, split_sections
+
+# 系统消息：角色和全部写作规范。所有请求（首轮改写、整篇修正、小节修正）共用这一段，
+# 逐字节不变地放在最前面，服务端的前缀缓存（prompt caching）才能命中；会变的内容只放在用户消息末尾。
+# 话术、标签、关键词、卖点顺序和禁词由 system_prompt() 按当前规则包填入，同一规则包渲染结果不变
+SYSTEM_PROMPT_TEMPLATE = """你是一个专业的小红书KOL稿件改写助手，也是小红书顶级爆文写手，擅长把硬广写成真实分享。严格遵守字数要求（{word_range}中文字）和话术要求。
+以下是【能恩全护奶粉】KOL稿件的写作规范，改写和修正都必须遵守。
+
+⚠️ 【最重要的3个硬性要求 - 必须全部满足】⚠️
+1. 正文字数必须在{word_range}字之间（这是最重要的！太短或太长都不行）
+2. 必须有强烈的小红书活人感、爆文感、真实分享感
+3. 必须包含下面{fixed_count}句话术（可以自然融入，但字字不能改）
+
+【{fixed_count}句必须原封不动出现的话术】
+{fixed_phrases}
+
+【小红书爆文写法 - 这才是活人感！】
+🔥 开头要炸：用"姐妹们！""救命！""后悔没早知道！"等情绪钩子开场
+🔥 说人话：把"因此建议"换成"所以我真心推荐"，把"具有"换成"有"
+🔥 像聊天：多用"我""你""咱家娃"，写得像在跟闺蜜分享经验
+🔥 有情绪：加入"说实话""真的绝了""一开始我也担心"等真实感受
+🔥 短句+emoji：每句话不超过20字，适当加💡✨🔥❗等emoji
+🔥 有节奏：用"！"比"。"多，读起来要有激动感
+🔥 结尾要互动："姐妹们冲！""有同款宝宝的妈妈评论区举手🙋‍♀️"
+
+【内容结构】（按这个顺序写，自然过渡）
+1. 开篇钩子：作为育婴师/营养师，说说妈妈们最担心的户外带娃敏敏问题（约70字）
+2. 痛点共鸣：我国初生宝宝敏敏率40%，有家族史飙到80%，太可怕了（约70字）
+3. 科学支招：第一口奶粉选对很关键，推荐适度水解配方（约200字）
+4. 产品种草：重点介绍能恩全护的水解技术、自护力配方、营养成分（约450字，融入{fixed_count}句话术）
+5. 收尾号召：想带娃放心玩，选对奶粉是第一步！（约60字）
+
+【其他要求】
+- 提供3个标题备选（必须含：{title_keywords}）
+- 提供10个以上话题标签（必须含：{required_tags}）
+- 卖点顺序：{order}
+- 禁词替换：{replacements}
+- 绝对禁止出现：{forbidden}
+- 以下固定用法不算禁词：{exceptions}
+
+【输出格式】
+### 标题备选（3个）
+1. xxx
+2. xxx
+3. xxx
+
+### 正文（{word_range}字，必须写够！）
+（这里输出完整正文，要有小红书爆文的活人感！）
+
+### 话题标签
+#能恩全护 #适度水解 ...（10个以上）"""
+
+# 人话修改 Prompt（首轮）
+RENHUA_PROMPT = """现在帮我按写作规范改写下面这篇【能恩全护奶粉】的KOL稿件，按输出格式直接输出完整稿件。
+
+---
+【需要改写的KOL原稿】
+{content}"""
+
+# 循环中后续轮次的修正 Prompt（固定说明在前，问题和稿件在后）
+FIX_PROMPT = """请按写作规范修正下面的稿件，解决检测到的问题，按输出格式直接输出修正后的完整稿件。
+⚠️ 正文必须在{word_range}字之间（最重要！），必须包含全部不可修改话术（字字不差），保持小红书活人感爆文风格。
+
+【需要修正的问题】
+{fix_hints}
+
+【当前稿件】
+{content}"""
+
+# 只有部分小节未通过时的修正 Prompt：只发送并重写这些小节
+SECTION_FIX_PROMPT = """请只修改下面稿件中的【{section_names}】部分，解决检测到的问题，其余部分不用动。
+
+【需要修正的问题】
+{fix_hints}
+
+【修正要求】
+{requirements}
+
+【需要修改的部分】
+{sections}
+
+请只输出修改后的这几部分，沿用原来的小标题，不要输出其他部分：
+{headers}"""
+
+SECTION_REQUIREMENTS_TEMPLATE = {
+    "titles": "- 标题备选：必须3个（格式 1. 2. 3.），每个都包含：{title_keywords}",
+    "body": "- 正文：保持小红书活人感爆文风格；卖点顺序 {order}；"
+            "必须包含全部{fixed_count}句不可修改话术（字字不差）；不得出现禁词（{forbidden}）",
+    "tags": "- 话题标签：10个以上，必须包括：{required_tags}",
+}
+
+# 按规则包 fingerprint 缓存渲染好的提示词片段，只保留最近几个版本
+_RENDERED = OrderedDict()
+_RENDERED_MAX = 4
+_rendered_lock = threading.Lock()
+
+
+def _word_range():
+    return "{}-{}".format(*WORD_COUNT_RANGE)
+
+def _fill(template, values):
+    for k, v in values.items():
+        template = template.replace("{" + k + "}", v)
+    return template
+
+def _render_rule_prompts(rules):
+    fixed = [sp["text"] for sp in rules.fixed_selling_points]
+    forbidden = dict.fromkeys(w for words in rules.forbidden_words.values() for w in words)
+    values = {
+        "word_range": _word_range(),
+        "fixed_count": str(len(fixed)),
+        "fixed_phrases": "\n".join(f"{chr(0x2460 + i) if i < 20 else f'{i + 1}.'} {t}" for i, t in enumerate(fixed)),
+        "title_keywords": "、".join(rules.title_keywords),
+        "required_tags": " ".join(rules.required_tags),
+        "order": " → ".join(rules.order_anchors),
+        "replacements": "、".join(f"{w}→{r}" for w, r in rules.forbidden_replacements.items()),
+        "forbidden": "、".join(forbidden),
+        "exceptions": "、".join(x for xs in rules.forbidden_exceptions.values() for x in xs),
+    }
+    return {
+        "system": _fill(SYSTEM_PROMPT_TEMPLATE, values),
+        "sections": {n: _fill(t, values) for n, t in SECTION_REQUIREMENTS_TEMPLATE.items()},
+    }
+
+def _rule_prompts(rules):
+    """规则包对应的系统消息和小节修正要求，按 fingerprint 缓存"""
+    rules = rules or get_active_rules()
+    with _rendered_lock:
+        got = _RENDERED.get(rules.fingerprint)
+        if got is None:
+            got = _RENDERED[rules.fingerprint] = _render_rule_prompts(rules)
+            while len(_RENDERED) > _RENDERED_MAX:
+                _RENDERED.popitem(last=False)
+        return got
+
+def system_prompt(rules=None):
+    """按规则包渲染的系统消息，同一规则包每次返回逐字节相同的内容"""
+    return _rule_prompts(rules)["system"]
+
+def section_requirements(rules=None):
+    """按规则包渲染的各小节修正要求，{节名: 要求}"""
+    return _rule_prompts(rules)["sections"]
+
+
+def build_messages(prompt, rules=None):
+    return [
+        {"role": "system", "content": system_prompt(rules)},
+        {"role": "user", "content": prompt},
+    ]
+
+def build_fix_hints(r, rules=None):
+    """根据审核结果列出需要 AI 修正的问题，卖点顺序和关键词取自规则包"""
+    rules = rules or get_active_rules()
+    fix_hints = []
+    if r.get("check1", {}).get("status") != "pass":
+        fix_hints.append(f"- 调整卖点顺序：必须按 {'→'.join(rules.order_anchors)} 顺序")
+    if r.get("check2", {}).get("status") != "pass":
+        wc = r['check2']['count']
+        hint = "字数不足，需扩充" if wc < WORD_COUNT_RANGE[0] else "字数超标，需精简"
+        fix_hints.append(f"- {hint}：正文当前{wc}字，必须在{_word_range()}字之间")
+    if r.get("check3", {}).get("status") != "pass":
+        fix_hints.append("- 必须提供3个备选标题（格式：### 标题备选（3个）然后 1. 2. 3.）")
+    if r.get("check4", {}).get("status") != "pass":
+        missing = r['check4'].get('missing', [])
+        fix_hints.append(f"- 补充标签：{', '.join(missing)}")
+    if r.get("check5", {}).get("status") != "pass":
+        fix_hints.append(f"- 标题必含【{'、'.join(rules.title_keywords)}】，正文必含【{'、'.join(rules.body_keywords)}】")
+    if r.get("check6", {}).get("status") != "pass":
+        found = [x['word'] for x in r['check6']['items'] if x['found']]
+        rep = {x['word']: x['replacement'] for x in r['check6']['items'] if x['found']}
+        fix_hints.append("- 替换禁词：" + "、".join([f"{w}→{rep[w]}" for w in found]))
+    if r.get("check7", {}).get("status") != "pass":
+        missing7 = [x['fragment'] for x in r['check7']['items'] if not x['found']]
+        fix_hints.append(f"- 补充润色卖点关键词：{', '.join(missing7[:5])}")
+    if r.get("check8", {}).get("status") != "pass":
+        missing8 = [x['text'] for x in r['check8']['items'] if not x['found']]
+        fix_hints.append("- 必须原封不动加入以下话术：\n  " + "\n  ".join(missing8))
+    return fix_hints
+
+def build_fix_prompt(content, r, rules=None):
+    fix_hints = build_fix_hints(r, rules)
+    prompt = (FIX_PROMPT
+              .replace("{word_range}", _word_range())
+              .replace("{fix_hints}", "\n".join(fix_hints))
+              .replace("{content}", content))
+    return prompt, fix_hints
+
+def repair_targets(content, r):
+    """把未通过的检查映射到需要重写的小节，按稿件顺序返回节名列表。
+
+    问题落在小标题之外、缺少对应小节，或三个小节都要重写时返回 None（改为整篇修正）"""
+    sections = parse_draft(content).sections
+    targets = set()
+    for k in SCORED_CHECKS:
+        if r.get(k, {}).get("status") == "pass":
+            continue
+        if k == "check3":
+            targets.add("titles")
+        elif k == "check4":
+            targets.add("tags")
+        elif k == "check5":
+            targets.update("titles" if x["scope"] == "标题" else "body" for x in r[k]["items"] if not x["found"])
+        elif k == "check6":
+            targets.update(section_of(sections, v["pos"]) for x in r[k]["items"] for v in x["violations"])
+        else:
+            targets.add("body")
+    if not targets or None in targets or not targets.issubset(sections) or len(targets) == len(SECTION_TITLES):
+        return None
+    return [name for name in SECTION_TITLES if name in targets]
+
+def build_section_fix_prompt(content, r, rules=None):
+    """只重写未通过检查涉及的小节。返回 (prompt, fix_hints, targets)，无法按小节修正时返回 None"""
+    targets = repair_targets(content, r)
+    if targets is None:
+        return None
+    sections = parse_draft(content).sections
+    fix_hints = build_fix_hints(r, rules)
+    blocks = "\n\n".join(f"{sections[n][0]}\n{section_text(content, sections, n)}" for n in targets)
+    prompt = (SECTION_FIX_PROMPT
+              .replace("{section_names}", "、".join(SECTION_TITLES[n] for n in targets))
+              .replace("{fix_hints}", "\n".join(fix_hints))
+              .replace("{requirements}", "\n".join(section_requirements(rules)[n] for n in targets))
+              .replace("{sections}", blocks)
+              .replace("{headers}", "\n".join(sections[n][0] for n in targets)))
+    return prompt, fix_hints, targets
+
+def splice_reply(content, reply, targets):
+    """把只含部分小节的回复拼回原稿，回复中缺少的小节保留原文"""
+    got = split_sections(reply)
+    if not got and len(targets) == 1:
+        # 只重写一个小节时模型可能省略小标题，整段回复即为该节内容
+        return splice_sections(content, {targets[0]: reply})
+    return splice_sections(content, {n: section_text(reply, got, n) for n in targets if n in got})
+
+def evaluate_candidate(text, rules=None, auditor=None):
+    """先做本地确定性修正（禁词替换、还原近似话术、补标签、补不可修改话术、超长删减）再跑八大审核，返回候选稿件及得分。
+
+    本地能修好的问题不会再触发 AI 重试"""
+    text, fixes = apply_local_fixes(text, rules)
+    checks = auditor.run(text, rules) if auditor else run_all_checks(text, rules)
+    return {"text": text, "inserted": len(fixes["inserted"]), "fixes": fixes, "checks": checks,
+            "passed": count_passed(checks)}
+
+USAGE_KEYS = ("prompt_tokens", "cached_tokens", "completion_tokens")
+
+def add_usage(total, usage):
+    """把一次调用的 token 用量累加到 total（缺少的项按 0 计），有任一次为本地估算时 total 也标为估算"""
+    for k in USAGE_KEYS:
+        total[k] = total.get(k, 0) + usage.get(k, 0)
+    total["estimated"] = total.get("estimated", False) or usage.get("estimated", False)
+    return total
+
+async def _race_candidates(client, messages, k, evaluate, use_cache=True, usage=None):
+    """同时发起 k 个生成，逐个到达即评分；出现全通过的候选立即取消其余请求。
+
+    返回 (最佳候选, 错误列表)，全部失败时最佳候选为 None。传入 usage 时累加已完成请求的 token 用量"""
+    usages = [{} for _ in range(k)]
+    tasks = [asyncio.ensure_future(client.achat(messages, use_cache=use_cache, variant=i, usage=usages[i]))
+             for i in range(k)]
+    best = None
+    errors = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                text = await next_done
+            except LLMError as e:
+                errors.append(str(e))
+                continue
+            cand = evaluate(text)
+            if best is None or cand["passed"] > best["passed"]:
+                best = cand
+            if cand["passed"] == len(SCORED_CHECKS):
+                break
+    finally:
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if usage is not None:
+            for u in usages:
+                add_usage(usage, u)
+    return best, errors
+
+def run_rewrite_loop(content, client, rules=None, auditor=None, max_retries=5, candidates=1,
+                     use_cache=True, section_repair=True, on_event=None, on_delta=None):
+    """人话修改自动循环，直到八大审核全部通过或达到最大尝试次数。
+
+    candidates > 1 时每轮并发生成多个候选，取最先全通过的，否则取本轮得分最高的进入下一轮修正；
+    candidates == 1 且传入 on_delta 时走流式接口；use_cache=False 跳过回复缓存强制重新生成。
+    section_repair 时后续轮次只重写未通过项所在的小节再拼回原稿。on_event(事件名, 数据) 用于汇报进度：
+    attempt / hints / checked / error，checked 带本轮的 token 用量 usage。
+
+    返回 {"result", "passed", "attempts", "checks", "error", "usage"}，usage 为各轮 token 用量之和；
+    max_retries < 1 时不调用 AI，result 和 checks 为 None"""
+    emit = on_event or (lambda event, data: None)
+    evaluate = lambda text: evaluate_candidate(text, rules, auditor)
+    best = None
+    attempt = 0
+    total_usage = add_usage({}, {})
+    while attempt < max_retries:
+        attempt += 1
+        emit("attempt", {"attempt": attempt, "max_retries": max_retries})
+        finish = lambda reply: reply
+        if best is None:
+            prompt = RENHUA_PROMPT.replace("{content}", content)
+        else:
+            repair = build_section_fix_prompt(best["text"], best["checks"], rules) if section_repair else None
+            targets = None
+            if repair:
+                prompt, fix_hints, targets = repair
+                finish = functools.partial(splice_reply, best["text"], targets=targets)
+            else:
+                prompt, fix_hints = build_fix_prompt(best["text"], best["checks"], rules)
+            emit("hints", {"attempt": attempt, "hints": fix_hints, "sections": targets})
+        messages = build_messages(prompt, rules)
+        usage = {}
+
+        try:
+            if candidates > 1:
+                cand, errors = asyncio.run(_race_candidates(client, messages, candidates,
+                                                            lambda text: evaluate(finish(text)), use_cache, usage))
+                if cand is None:
+                    raise LLMError(errors[0] if errors else "没有生成结果")
+            elif on_delta is not None:
+                parts = []
+                for delta in client.stream_chat(messages, use_cache=use_cache, usage=usage):
+                    parts.append(delta)
+                    on_delta(finish("".join(parts)))
+                cand = evaluate(finish("".join(parts)))
+            else:
+                cand = evaluate(finish(client.chat(messages, use_cache=use_cache, usage=usage)))
+        except LLMError as e:
+            add_usage(total_usage, usage)
+            emit("error", {"attempt": attempt, "error": str(e)})
+            return {"result": best and best["text"], "passed": False, "attempts": attempt,
+                    "checks": best and best["checks"], "error": str(e), "usage": total_usage}
+
+        add_usage(total_usage, usage)
+        best = cand
+        emit("checked", {"attempt": attempt, "passed": cand["passed"], "inserted": cand["inserted"],
+                         "fixes": cand["fixes"], "text": best["text"], "usage": usage})
+        if best["passed"] == len(SCORED_CHECKS):
+            break
+
+    # max_retries < 1 时一轮也没跑，best 为 None
+    return {"result": best and best["text"], "passed": best is not None and best["passed"] == len(SCORED_CHECKS),
+            "attempts": attempt, "checks": best and best["checks"], "error": None, "usage": total_usage}
@@ -0,0 +1,164 @@
+"""审核规则包：从 JSON/YAML 加载规则，编译成匹配器，磁盘缓存并支持运行中热更新"""
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+
+from matcher import MultiPatternMatcher
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RULE_PACK = os.path.join(BASE_DIR, "rules", "default.json")
+RULE_CACHE_DIR = os.environ.get("RULE_CACHE_DIR", os.path.join(BASE_DIR, ".rule_cache"))
+
+# 编译逻辑变化时递增，使旧缓存失效
+COMPILER_VERSION = 3
+
+RULE_KEYS = [
+    "required_tags", "title_keywords", "body_keywords", "cover_keywords",
+    "forbidden_words", "forbidden_exceptions", "forbidden_replacements",
+    "paraphrase_selling_points", "fixed_selling_points", "optional_selling_points",
+    "order_anchors",
+]
+
+
+class RulePackError(ValueError):
+    pass
+
+
+class RulePack:
+    """一份已编译的规则包。字段与规则文件中的键同名，另带 matcher 与 fingerprint。
+
+    multiline_patterns 表示是否有跨行的规则短语（此时不能按段落增量扫描）"""
+
+    def __init__(self, data, fingerprint):
+        missing = [k for k in RULE_KEYS if k not in data]
+        if missing:
+            raise RulePackError(f"规则包缺少字段: {', '.join(missing)}")
+        self.name = data.get("name", "")
+        self.selling_point_example = data.get("selling_point_example", "")
+        self.fingerprint = fingerprint
+        for k in RULE_KEYS:
+            setattr(self, k, data[k])
+        self.matcher = self._compile()
+
+    def _compile(self):
+        """把全部规则编译进一个自动机，标签为 (类别, 键)"""
+        patterns = []
+        for cat, phrases in self.order_anchors.items():
+            for p in phrases:
+                patterns.append((p, ("order", cat)))
+        for words in self.forbidden_words.values():
+            for w in words:
+                patterns.append((w, ("forbidden", w)))
+        for w in dict.fromkeys(self.body_keywords + self.cover_keywords):
+            patterns.append((w, ("keyword", w)))
+        for sp in self.paraphrase_selling_points:
+            patterns.append((sp["fragment"], ("paraphrase", sp["idx"])))
+        for sp in self.fixed_selling_points:
+            patterns.append((sp["text"], ("fixed", sp["idx"])))
+        for i, sp in enumerate(self.optional_selling_points):
+            patterns.append((sp["fragment"], ("optional", i)))
+        for word, phrases in self.forbidden_exceptions.items():
+            for exc in phrases:
+                patterns.append((exc, ("exception", word, exc)))
+        self.multiline_patterns = any("\n" in p for p, _ in patterns)
+        return MultiPatternMatcher(patterns)
+
+
+def _parse(raw, path):
+    if path.endswith((".yaml", ".yml")):
+        if yaml is None:
+            raise RulePackError("读取 YAML 规则包需要安装 PyYAML")
+        try:
+            data = yaml.safe_load(raw.decode("utf-8"))
+        except yaml.YAMLError as e:
+            raise RulePackError(f"规则包解析失败: {e}")
+    else:
+        data = json.loads(raw.decode("utf-8"))
+    if not isinstance(data, dict):
+        raise RulePackError(f"规则包格式错误: {path}")
+    return data
+
+
+def _write_cache(cache_path, pack):
+    """先写临时文件再 rename，避免并发进程读到半个缓存"""
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(pack, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_path)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def load_rule_pack(path=DEFAULT_RULE_PACK, cache_dir=RULE_CACHE_DIR):
+    """加载并编译规则包。编译结果按文件内容哈希缓存在 cache_dir，命中时直接反序列化"""
+    with open(path, "rb") as f:
+        raw = f.read()
+    fingerprint = hashlib.sha256(raw).hexdigest()
+    cache_path = None
+    if cache_dir:
+        cache_path = os.path.join(cache_dir, f"{fingerprint[:32]}-v{COMPILER_VERSION}.pickle")
+        try:
+            with open(cache_path, "rb") as f:
+                pack = pickle.load(f)
+            if isinstance(pack, RulePack) and pack.fingerprint == fingerprint:
+                return pack
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            pass
+    pack = RulePack(_parse(raw, path), fingerprint)
+    if cache_path:
+        _write_cache(cache_path, pack)
+    return pack
+
+
+# ========== 运行中的规则包（进程内共享，所有会话可见） ==========
+_active_pack = None
+_active_stamp = None
+_active_path = None
+_reload_lock = threading.Lock()
+
+
+def rule_pack_path():
+    return os.environ.get("RULE_PACK_PATH", DEFAULT_RULE_PACK)
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def get_active_rules():
+    """返回当前生效的规则包。
+
+    每次调用只做一次 stat；规则文件变化时重新加载并整体替换引用，
+    正在使用旧规则包的调用不受影响。新文件有误时继续沿用旧规则包。"""
+    global _active_pack, _active_stamp, _active_path
+    path = rule_pack_path()
+    try:
+        stamp = _stamp(path)
+    except OSError:
+        if _active_pack is not None:
+            return _active_pack
+        raise
+    if _active_pack is not None and stamp == _active_stamp and path == _active_path:
+        return _active_pack
+    with _reload_lock:
+        if _active_pack is None or stamp != _active_stamp or path != _active_path:
+            try:
+                pack = load_rule_pack(path)
+            except (OSError, ValueError):
+                if _active_pack is None:
+                    raise
+                pack = _active_pack
+            _active_pack, _active_stamp, _active_path = pack, stamp, path
+    return _active_pack
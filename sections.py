@@ -0,0 +1,50 @@
+"""稿件分节：按「### 标题备选 / ### 正文 / ### 话题标签」切分与拼回（不依赖 Streamlit）"""
+import re
+
+# 节名 → 小标题关键字，顺序即稿件中的标准顺序
+SECTION_TITLES = {"titles": "标题备选", "body": "正文", "tags": "话题标签"}
+SECTION_HEADERS = {"titles": "### 标题备选（3个）", "body": "### 正文", "tags": "### 话题标签"}
+
+_HEADER_RE = re.compile(r"^[ \t]*###\s*(标题备选|正文|话题标签)[^\n]*$", re.MULTILINE)
+_NAME_BY_TITLE = {v: k for k, v in SECTION_TITLES.items()}
+
+
+def split_sections(text):
+    """返回 {节名: (小标题行, 内容起点, 内容终点)}，区间为该节内容在 text 中的位置（不含小标题行）。
+
+    同名小标题出现多次时取第一个；没有任何小标题时返回空字典"""
+    matches = list(_HEADER_RE.finditer(text))
+    sections = {}
+    for i, m in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        sections.setdefault(_NAME_BY_TITLE[m.group(1)], (m.group(0).strip(), m.end(), end))
+    return sections
+
+
+def section_text(text, sections, name):
+    _, start, end = sections[name]
+    return text[start:end].strip()
+
+
+def section_of(sections, pos):
+    """pos 所在的节名，落在所有小标题之外（或小标题行上）时返回 None"""
+    for name, (_, start, end) in sections.items():
+        if start <= pos < end:
+            return name
+    return None
+
+
+def splice_sections(text, replacements):
+    """把 {节名: 新内容} 替换回 text 中对应的节，其余部分原样保留"""
+    sections = split_sections(text)
+    spans = sorted((sections[name][1], sections[name][2], content)
+                   for name, content in replacements.items() if name in sections)
+    parts = []
+    pos = 0
+    for start, end, content in spans:
+        parts.append(text[pos:start])
+        tail = "\n\n" if end < len(text) else "\n" if text.endswith("\n") else ""
+        parts.append("\n" + content.strip() + tail)
+        pos = end
+    parts.append(text[pos:])
+    return "".join(parts)
@@ -0,0 +1,124 @@
+import json
+import unittest
+
+from audit import ExceptionIndex, IncrementalAuditor, auto_insert_fixed_phrases, check_forbidden_word, run_all_checks
+from benchmarks.corpus import make_draft
+from draft import parse_draft
+from rule_pack import DEFAULT_RULE_PACK, RulePack, get_active_rules
+from sections import split_sections
+
+
+class AutoInsertFixedPhrasesTest(unittest.TestCase):
+    def setUp(self):
+        self.rules = get_active_rules()
+
+    def test_insert_without_anchor_keeps_next_header_on_its_own_line(self):
+        content = "\n".join([
+            "### 标题备选（3个）",
+            "1. 适度水解防敏科普",
+            "",
+            "### 正文",
+            "姐妹们！今天聊聊怎么给娃选奶粉。",
+            "咱家娃最近喝得很开心。",
+            "",
+            "### 话题标签",
+            "#能恩全护 #适度水解",
+        ])
+        text, edits = auto_insert_fixed_phrases(content, self.rules)
+
+        self.assertEqual(len(edits), len(self.rules.fixed_selling_points))
+        self.assertEqual(list(split_sections(text)), ["titles", "body", "tags"])
+        self.assertNotIn("#", parse_draft(text).body)
+        for e in edits:
+            self.assertEqual(text[e["pos"]:e["pos"] + len(e["text"])], e["text"])
+
+
+class ForbiddenExceptionTest(unittest.TestCase):
+    """例外短语按区间覆盖豁免：只有被同一禁词的例外短语完整覆盖的命中才不算违规"""
+
+    def setUp(self):
+        self.rules = get_active_rules()
+
+    def violations(self, content, word):
+        return [v["pos"] for v in check_forbidden_word(content, word, rules=self.rules)]
+
+    def test_word_inside_exception_phrase_is_exempt(self):
+        self.assertEqual(self.violations("有家族过敏史的宝宝", "过敏"), [])
+        self.assertEqual(self.violations("选对第一口奶粉", "第一"), [])
+        self.assertEqual(self.violations("宝宝过敏了", "过敏"), [2])
+
+    def test_exception_elsewhere_does_not_exempt_other_hits(self):
+        # 旧实现只看上下文里有没有例外短语，同一句里的真违规也被放过
+        content = "家长谈敏色变，娃过敏了"
+        self.assertEqual(self.violations(content, "过敏"), [8])
+        self.assertEqual(self.violations("过敏史和过敏", "过敏"), [4])
+
+    def test_hit_at_exception_span_edge(self):
+        # 「生长曲线」只覆盖其中的「生长」，紧挨在前面的一次不豁免
+        self.assertEqual(self.violations("生长生长曲线", "生长"), [0])
+        self.assertEqual(self.violations("怕娃过敏过敏", "过敏"), [4])
+
+    def test_overlapping_exception_spans(self):
+        # 「怕娃过敏」与「过敏史」重叠，两者都覆盖同一次「过敏」
+        self.assertEqual(self.violations("怕娃过敏史", "过敏"), [])
+        index = ExceptionIndex({"w": [(0, 5), (3, 10), (2, 4)]})
+        self.assertTrue(index.covers("w", 6, 8))
+        self.assertTrue(index.covers("w", 3, 10))
+        self.assertFalse(index.covers("w", 1, 6))
+        self.assertFalse(index.covers("w", 9, 11))
+        self.assertFalse(index.covers("other", 0, 2))
+
+    def test_exception_only_applies_to_its_own_word(self):
+        index = ExceptionIndex({"第一": [(0, 5)]})
+        self.assertTrue(index.covers("第一", 0, 2))
+        self.assertFalse(index.covers("最", 0, 1))
+
+
+class IncrementalAuditorTest(unittest.TestCase):
+    """按段落缓存的增量审核在一连串修改后仍与整篇 run_all_checks 一致"""
+
+    def setUp(self):
+        self.rules = get_active_rules()
+        self.auditor = IncrementalAuditor()
+
+    def assertSameAsFullScan(self, content, rules):
+        self.assertEqual(self.auditor.run(content, rules), run_all_checks(content, rules))
+
+    def test_matches_full_scan_over_edit_sequence(self):
+        content = make_draft(3000, forbidden_density=3, exception_density=3, seed=1, rules=self.rules)
+        self.assertSameAsFullScan(content, self.rules)
+
+        lines = content.split("\n")
+        mid = len(lines) // 2
+        steps = [
+            # 段内改字：替换一个禁词、删掉一条不可修改话术
+            lambda t: t.replace("过敏", "敏敏", 1),
+            lambda t: t.replace(next(sp["text"] for sp in self.rules.fixed_selling_points if sp["text"] in t), "", 1),
+            # 插入、删除段落
+            lambda t: "\n".join(lines[:mid] + ["宝宝过敏了怎么办？第一口奶粉很关键。"] + lines[mid:]),
+            lambda t: "\n".join(t.split("\n")[:mid - 2] + t.split("\n")[mid + 1:]),
+            # 合并两段、段首加空行
+            lambda t: t.replace("\n", "", 1),
+            lambda t: "\n" + t,
+            # 本地修正整体改写
+            lambda t: auto_insert_fixed_phrases(t, self.rules)[0],
+        ]
+        for step in steps:
+            content = step(content)
+            self.assertSameAsFullScan(content, self.rules)
+
+    def test_rule_pack_change_does_not_reuse_stale_hits(self):
+        content = make_draft(2000, forbidden_density=3, seed=2, rules=self.rules)
+        self.assertSameAsFullScan(content, self.rules)
+
+        with open(DEFAULT_RULE_PACK, encoding="utf-8") as f:
+            data = json.load(f)
+        data["forbidden_words"]["禁止词"].append("宝宝")
+        data["forbidden_exceptions"].pop("过敏")
+        rules = RulePack(data, "test-changed")
+        self.assertSameAsFullScan(content, rules)
+        self.assertNotEqual(self.auditor.run(content, rules)["check6"], self.auditor.run(content, self.rules)["check6"])
+
+
+if __name__ == "__main__":
+    unittest.main()
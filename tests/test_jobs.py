@@ -0,0 +1,29 @@
+import threading
+import unittest
+
+from jobs import JobRunner
+
+
+class JobOwnerTest(unittest.TestCase):
+    def setUp(self):
+        self.runner = JobRunner(max_workers=1)
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+
+    def test_job_is_only_returned_to_its_owner(self):
+        job = self.runner.submit("renhua", lambda job: self.release.wait(5),
+                                 state={"kol_content": "稿件"}, owner="owner-a")
+        self.assertIs(self.runner.get(job.id, "owner-a"), job)
+        self.assertIsNone(self.runner.get(job.id, "owner-b"))
+        self.assertIsNone(self.runner.get(job.id))
+
+    def test_job_without_owner_is_returned_without_owner(self):
+        job = self.runner.submit("regen", lambda job: self.release.wait(5))
+        self.assertIs(self.runner.get(job.id), job)
+        self.assertIsNone(self.runner.get(job.id, "owner-a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,24 @@
+import tempfile
+import unittest
+
+from llm_cache import CompletionCache
+
+
+class CompletionCacheSizeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = CompletionCache(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_overwriting_a_key_does_not_double_count(self):
+        self.cache.put("aa01", "初稿")
+        for text in ["第二版回复" * 50, "短", "第四版"]:
+            self.cache.put("aa01", text)
+            self.assertEqual(self.cache._size, self.cache._scan_size())
+        self.assertEqual(self.cache.get("aa01"), "第四版")
+
+
+if __name__ == "__main__":
+    unittest.main()
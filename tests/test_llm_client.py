@@ -0,0 +1,75 @@
+import asyncio
+import os
+import socket
+import unittest
+from unittest import mock
+
+import llm_client
+from llm_client import LLMClient, LLMError, _CancelToken, get_client
+from mock_llm_server import start_server
+
+MESSAGES = [{"role": "user", "content": "写一篇稿件"}]
+
+
+class CancelTokenTest(unittest.TestCase):
+    def setUp(self):
+        self.server = start_server()
+        self.client = LLMClient(base_url=self.server.base_url, api_key="k")
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_cancel_before_connection_sends_no_request(self):
+        cancel = _CancelToken()
+        cancel.cancel()
+        with self.assertRaises(LLMError):
+            self.client.chat(MESSAGES, _cancel=cancel)
+        self.assertEqual(self.server.stats["requests"], 0)
+
+    def test_cancel_after_release_leaves_pooled_connection_alone(self):
+        cancel = _CancelToken()
+        self.client.chat(MESSAGES, _cancel=cancel)
+        pooled = self.client._pool.queue[-1]
+        cancel.cancel()
+        # 未被 shutdown 的 keep-alive 连接上没有可读数据；被 shutdown 后会立即读到 EOF
+        pooled.sock.setblocking(False)
+        with self.assertRaises(BlockingIOError):
+            pooled.sock.recv(1, socket.MSG_PEEK)
+        pooled.sock.settimeout(self.client.read_timeout)
+        self.client.chat(MESSAGES)
+        self.assertEqual(self.server.stats["requests"], 2)
+
+
+class CloseTest(unittest.TestCase):
+    def setUp(self):
+        self.server = start_server()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_close_shuts_down_achat_threads(self):
+        client = LLMClient(base_url=self.server.base_url, api_key="k")
+        self.assertTrue(asyncio.run(client.achat(MESSAGES)))
+        executor = client._executor
+        client.close()
+        self.assertTrue(executor._shutdown)
+        # 关闭后再用会新建线程池
+        self.assertTrue(asyncio.run(client.achat(MESSAGES)))
+        client.close()
+
+    def test_get_client_closes_replaced_client(self):
+        env = {"OPENAI_BASE_URL": self.server.base_url, "OPENAI_API_KEY": "k", "LLM_CACHE_DIR": "", "LLM_MODEL": "a"}
+        with mock.patch.dict(os.environ, env), mock.patch.object(llm_client, "_client", None):
+            old = get_client()
+            asyncio.run(old.achat(MESSAGES))
+            executor = old._executor
+            os.environ["LLM_MODEL"] = "b"
+            new = get_client()
+            self.assertIsNot(new, old)
+            self.assertTrue(executor._shutdown)
+            new.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
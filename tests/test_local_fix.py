@@ -0,0 +1,60 @@
+import unittest
+
+from audit import SCORED_CHECKS, WORD_COUNT_RANGE, run_all_checks
+from draft import parse_draft
+from local_fix import trim_to_length
+from rule_pack import get_active_rules
+
+
+def over_length_draft(rules, target):
+    """以规则包的标准卖点文案为正文（可删减卖点与不可修改话术同句），补充口语段落到 target 字以上"""
+    fillers = ["咱家娃喝了以后状态稳稳的，每次冲奶都觉得很安心。", "身边宝妈问了我好几次，我自己对比了好久才定下来。"]
+    paragraphs = [rules.selling_point_example]
+    i = 0
+    while parse_draft("### 正文\n" + "\n".join(paragraphs)).word_count < target:
+        paragraphs.insert(1, fillers[i % len(fillers)])
+        i += 1
+    tags = " ".join(dict.fromkeys(rules.required_tags + ["#育儿经验", "#宝宝奶粉", "#新手妈妈"]))
+    return "\n".join([
+        "### 标题备选（3个）",
+        "1. 适度水解防敏科普｜新手妈妈必看",
+        "2. 适度水解防敏科普：第一口奶粉怎么选",
+        "3. 防敏科普来了！适度水解到底怎么选",
+        "",
+        "### 正文",
+        *paragraphs,
+        "",
+        "### 话题标签",
+        tags,
+    ])
+
+
+class TrimToLengthTest(unittest.TestCase):
+    def setUp(self):
+        self.rules = get_active_rules()
+
+    def test_optional_clause_next_to_fixed_phrase_is_trimmed_into_range(self):
+        content = over_length_draft(self.rules, WORD_COUNT_RANGE[1] + 20)
+        self.assertGreater(parse_draft(content).word_count, WORD_COUNT_RANGE[1])
+        before = run_all_checks(content, self.rules)
+
+        text, removed = trim_to_length(content, self.rules)
+
+        lo, hi = WORD_COUNT_RANGE
+        self.assertTrue(removed)
+        self.assertTrue(lo <= parse_draft(text).word_count <= hi)
+        after = run_all_checks(text, self.rules)
+        for k in SCORED_CHECKS:
+            if k != "check2" and before[k]["status"] == "pass":
+                self.assertEqual(after[k]["status"], "pass", k)
+        for sp in self.rules.fixed_selling_points:
+            if sp["text"] in content:
+                self.assertIn(sp["text"], text)
+
+    def test_draft_in_range_is_untouched(self):
+        content = over_length_draft(self.rules, WORD_COUNT_RANGE[0] + 20)
+        self.assertEqual(trim_to_length(content, self.rules), (content, []))
+
+
+if __name__ == "__main__":
+    unittest.main()
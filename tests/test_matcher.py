@@ -0,0 +1,140 @@
+import random
+import unittest
+from unittest import mock
+
+from benchmarks.corpus import make_draft
+from matcher import MultiPatternMatcher, approx_search
+from rule_pack import get_active_rules
+
+
+def find_all(patterns, text):
+    """逐个模式用 str.find 找出全部（含重叠）出现位置，作为对照"""
+    hits = {}
+    for pattern, label in patterns:
+        pos = text.find(pattern)
+        while pos != -1:
+            hits.setdefault(label, []).append(pos)
+            pos = text.find(pattern, pos + 1)
+    for positions in hits.values():
+        positions.sort()
+    return hits
+
+
+def rule_patterns(rules):
+    """规则包编译进自动机的 (模式串, 标签) 列表"""
+    captured = []
+    with mock.patch("rule_pack.MultiPatternMatcher", side_effect=captured.append):
+        rules._compile()
+    return captured[0]
+
+
+class MultiPatternMatcherTest(unittest.TestCase):
+    def assertMatchesFind(self, patterns, text):
+        self.assertEqual(MultiPatternMatcher(patterns).scan(text), find_all(patterns, text))
+
+    def test_overlapping_patterns(self):
+        patterns = [(p, p) for p in ["he", "she", "his", "hers"]]
+        self.assertEqual(MultiPatternMatcher(patterns).scan("ushers"), {"she": [1], "he": [2], "hers": [2]})
+        self.assertMatchesFind(patterns, "ushershishehers")
+        self.assertMatchesFind([("aa", "aa"), ("aaa", "aaa")], "aaaaa")
+
+    def test_pattern_that_is_suffix_of_another(self):
+        patterns = [(p, p) for p in ["适度水解", "水解", "解", "度水"]]
+        self.assertEqual(MultiPatternMatcher(patterns).scan("适度水解奶粉"),
+                         {"适度水解": [0], "度水": [1], "水解": [2], "解": [3]})
+        self.assertMatchesFind(patterns, "温和的适度水解小分子，尖峰水解，水水解解")
+
+    def test_same_pattern_with_several_labels(self):
+        matcher = MultiPatternMatcher([("防敏", "title"), ("防敏", "body"), ("", "empty")])
+        self.assertEqual(matcher.scan("防敏防敏"), {"title": [0, 2], "body": [0, 2]})
+
+    def test_iter_matches_reports_lengths_in_end_order(self):
+        matches = list(MultiPatternMatcher([("ab", 1), ("b", 2), ("abc", 3)]).iter_matches("abc"))
+        self.assertEqual(matches, [(0, 2, 1), (1, 1, 2), (0, 3, 3)])
+
+    def test_rule_pack_scan_equals_find_loop(self):
+        rules = get_active_rules()
+        patterns = rule_patterns(rules)
+        for seed in range(3):
+            text = make_draft(4000, forbidden_density=5, exception_density=5, seed=seed, rules=rules)
+            self.assertEqual(rules.matcher.scan(text), find_all(patterns, text))
+
+
+def levenshtein(a, b):
+    prev = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        cur = [i]
+        for j, y in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (x != y)))
+        prev = cur
+    return prev[-1]
+
+
+def best_by_end(pattern, text):
+    """每个结束位置 j 上 pattern 与某个 text[s:j] 的最小编辑距离（逐个起点暴力计算）"""
+    return [min(levenshtein(pattern, text[s:j]) for s in range(j + 1)) for j in range(len(text) + 1)]
+
+
+class ApproxSearchTest(unittest.TestCase):
+    def check_against_brute_force(self, pattern, text, k):
+        found = approx_search(pattern, text, k)
+        best = best_by_end(pattern, text)
+        m = len(pattern)
+        # 每一段连续满足 best ≤ k 的结束位置，取距离最小的第一个
+        run_ends = []
+        run = None
+        for j in range(1, len(text) + 1):
+            if best[j] <= k:
+                if run is None or best[j] < best[run]:
+                    run = j
+            elif run is not None:
+                run_ends.append(run)
+                run = None
+        if run is not None:
+            run_ends.append(run)
+
+        last = 0
+        for s, e, d in found:
+            self.assertLessEqual(last, s)
+            self.assertLess(s, e)
+            self.assertEqual(levenshtein(pattern, text[s:e]), d)
+            self.assertLessEqual(d, k)
+            self.assertIn(e, run_ends)
+            last = e
+        by_end = {e: (s, d) for s, e, d in found}
+        last = 0
+        for e in run_ends:
+            if e - m - k >= last:
+                # 回溯窗口没被前一个命中截断时必须报出，距离就是暴力结果
+                self.assertIn(e, by_end, (pattern, text, k))
+                self.assertEqual(by_end[e][1], best[e])
+            if e in by_end:
+                last = e
+
+    def test_matches_brute_force_on_small_inputs(self):
+        rng = random.Random(0)
+        for _ in range(400):
+            pattern = "".join(rng.choice("abc") for _ in range(rng.randint(1, 6)))
+            text = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 20)))
+            self.check_against_brute_force(pattern, text, rng.randint(0, 2))
+
+    def test_near_miss_fixed_phrase(self):
+        phrase = "协同作用释放高倍的原生保护力"
+        text = "它能协同作用释放高倍原生保护力，很安心"
+        self.assertEqual(approx_search(phrase, text, 1), [(2, 15, 1)])
+        self.assertEqual(approx_search(phrase, text, 0), [])
+        self.assertEqual(approx_search("", text, 1), [])
+
+    def test_start_end_restrict_search(self):
+        rng = random.Random(1)
+        for _ in range(200):
+            pattern = "".join(rng.choice("ab") for _ in range(rng.randint(1, 5)))
+            text = "".join(rng.choice("abc") for _ in range(rng.randint(0, 25)))
+            lo = rng.randint(0, len(text))
+            hi = rng.randint(lo, len(text))
+            expected = [(s + lo, e + lo, d) for s, e, d in approx_search(pattern, text[lo:hi], 1)]
+            self.assertEqual(approx_search(pattern, text, 1, lo, hi), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
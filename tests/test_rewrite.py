@@ -0,0 +1,92 @@
+import json
+import os
+import tempfile
+import unittest
+
+from audit import SCORED_CHECKS, WORD_COUNT_RANGE
+from rewrite import (build_fix_hints, build_fix_prompt, build_messages, run_rewrite_loop, section_requirements,
+                     system_prompt)
+from rule_pack import DEFAULT_RULE_PACK, load_rule_pack
+
+
+def load_modified_pack(change):
+    """默认规则包经 change(data) 修改后写到临时文件再加载"""
+    with open(DEFAULT_RULE_PACK, encoding="utf-8") as f:
+        data = json.load(f)
+    change(data)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "rules.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        return load_rule_pack(path, cache_dir=None)
+
+
+class SystemPromptTest(unittest.TestCase):
+    def setUp(self):
+        self.rules = load_rule_pack(DEFAULT_RULE_PACK, cache_dir=None)
+
+    def test_prompt_is_byte_stable_for_same_rules(self):
+        again = load_rule_pack(DEFAULT_RULE_PACK, cache_dir=None)
+        self.assertEqual(system_prompt(self.rules), system_prompt(again))
+        self.assertEqual(build_messages("a", self.rules)[0], build_messages("b", again)[0])
+
+    def test_prompt_lists_rule_pack_content(self):
+        prompt = system_prompt(self.rules)
+        for sp in self.rules.fixed_selling_points:
+            self.assertIn(sp["text"], prompt)
+        for tag in self.rules.required_tags:
+            self.assertIn(tag, prompt)
+        self.assertNotIn("{", prompt)
+
+    def test_changed_rule_pack_changes_prefix(self):
+        def change(data):
+            data["fixed_selling_points"][0]["text"] = "全新升级的水解配方"
+            data["required_tags"].append("#新标签")
+            data["forbidden_replacements"]["奶瓶"] = "喂养工具"
+        changed = load_modified_pack(change)
+        self.assertNotEqual(changed.fingerprint, self.rules.fingerprint)
+
+        prompt = system_prompt(changed)
+        self.assertNotEqual(prompt, system_prompt(self.rules))
+        self.assertIn("全新升级的水解配方", prompt)
+        self.assertNotIn(self.rules.fixed_selling_points[0]["text"], prompt)
+        self.assertIn("奶瓶→喂养工具", prompt)
+        self.assertIn("#新标签", section_requirements(changed)["tags"])
+        self.assertNotIn("#新标签", section_requirements(self.rules)["tags"])
+
+
+class FixHintsTest(unittest.TestCase):
+    def test_hints_follow_rule_pack(self):
+        def change(data):
+            data["title_keywords"] = ["新品", "科普"]
+            data["order_anchors"] = dict(reversed(list(data["order_anchors"].items())))
+        rules = load_modified_pack(change)
+        r = {k: {"status": "pass"} for k in SCORED_CHECKS}
+        r.update({"check1": {"status": "fail"}, "check2": {"status": "fail", "count": 950}, "check5": {"status": "fail"}})
+
+        hints = "\n".join(build_fix_hints(r, rules))
+        self.assertIn("→".join(rules.order_anchors), hints)
+        self.assertIn("新品、科普", hints)
+        self.assertIn("{}-{}".format(*WORD_COUNT_RANGE), hints)
+
+        prompt, _ = build_fix_prompt("稿件", r, rules)
+        self.assertIn("{}-{}".format(*WORD_COUNT_RANGE), prompt)
+        self.assertNotIn("{", prompt)
+
+
+class RewriteLoopTest(unittest.TestCase):
+    def test_zero_retries_returns_no_attempt_result(self):
+        class NoCallClient:
+            def chat(self, *args, **kwargs):
+                raise AssertionError("max_retries=0 不应调用 AI")
+
+        out = run_rewrite_loop("稿件", NoCallClient(), max_retries=0)
+        self.assertIsNone(out["result"])
+        self.assertIsNone(out["checks"])
+        self.assertFalse(out["passed"])
+        self.assertEqual(out["attempts"], 0)
+        self.assertIsNone(out["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
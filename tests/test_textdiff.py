@@ -0,0 +1,87 @@
+import random
+import unittest
+
+from benchmarks.corpus import make_draft
+from rule_pack import get_active_rules
+from textdiff import diff_changes, diff_hunks, myers_hunks
+
+
+def rebuild(a, b, hunks):
+    """按差异块把 a 改写成 b，块必须按位置排序且互不重叠"""
+    parts = []
+    pos = 0
+    for i1, i2, j1, j2 in hunks:
+        assert pos <= i1 <= i2, (pos, i1, i2)
+        parts.append(a[pos:i1])
+        parts.append(b[j1:j2])
+        pos = i2
+    parts.append(a[pos:])
+    return "".join(parts)
+
+
+def indel_distance(a, b):
+    """只允许插入、删除时的编辑距离 len(a) + len(b) - 2·LCS（动态规划对照）"""
+    prev = [0] * (len(b) + 1)
+    for x in a:
+        cur = [0]
+        for j, y in enumerate(b):
+            cur.append(prev[j] + 1 if x == y else max(prev[j + 1], cur[j]))
+        prev = cur
+    return len(a) + len(b) - 2 * prev[-1]
+
+
+def random_pairs(count, alphabet="ab c\n", max_len=25, seed=0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield ("".join(rng.choice(alphabet) for _ in range(rng.randint(0, max_len))),
+               "".join(rng.choice(alphabet) for _ in range(rng.randint(0, max_len))))
+
+
+class MyersHunksTest(unittest.TestCase):
+    def test_hunks_rebuild_target_with_minimal_edits(self):
+        for a, b in random_pairs(500):
+            hunks = myers_hunks(a, b)
+            self.assertEqual(rebuild(a, b, hunks), b)
+            self.assertEqual(sum(i2 - i1 + j2 - j1 for i1, i2, j1, j2 in hunks), indel_distance(a, b), (a, b))
+
+    def test_identical_and_empty_inputs(self):
+        self.assertEqual(myers_hunks("abc", "abc"), [])
+        self.assertEqual(myers_hunks("", ""), [])
+        self.assertEqual(myers_hunks("", "ab"), [(0, 0, 0, 2)])
+        self.assertEqual(myers_hunks("ab", ""), [(0, 2, 0, 0)])
+
+    def test_max_d_limits_search(self):
+        for a, b in random_pairs(200, seed=1):
+            d = indel_distance(a, b)
+            if d:
+                self.assertIsNone(myers_hunks(a, b, d - 1))
+            self.assertIsNotNone(myers_hunks(a, b, d))
+
+    def test_sequences_of_lines(self):
+        a = ["一\n", "二\n", "三\n"]
+        b = ["一\n", "三\n", "四\n"]
+        self.assertEqual(myers_hunks(a, b), [(1, 2, 1, 1), (3, 3, 2, 3)])
+
+
+class DiffChangesTest(unittest.TestCase):
+    def test_rebuild_with_small_edit_budget(self):
+        # max_d 很小时走按行对比再细化的路径，结果仍需能还原
+        for a, b in random_pairs(300, seed=2, max_len=40):
+            for max_d in (0, 1, 3, None):
+                hunks = diff_hunks(a, b) if max_d is None else diff_hunks(a, b, max_d)
+                self.assertEqual(rebuild(a, b, hunks), b)
+
+    def test_changes_on_drafts(self):
+        rules = get_active_rules()
+        a = make_draft(4000, forbidden_density=2, seed=0, rules=rules)
+        for b in [a.replace("宝宝", "宝贝"), make_draft(4000, seed=1, rules=rules), "", a + "\n补一段"]:
+            changes = diff_changes(a, b)
+            hunks = [(c["pos"], c["pos"] + len(c["old"]), c["new_pos"], c["new_pos"] + len(c["new"])) for c in changes]
+            self.assertEqual(rebuild(a, b, hunks), b)
+            for c in changes:
+                self.assertEqual(a[c["pos"]:c["pos"] + len(c["old"])], c["old"])
+                self.assertEqual(b[c["new_pos"]:c["new_pos"] + len(c["new"])], c["new"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+"""字符级文本差异（Myers 算法），用于对比预览的高亮（不依赖 Streamlit）
+
+差异以「块」表示：(i1, i2, j1, j2) 即 a[i1:i2] 被替换为 b[j1:j2]，块之外的部分两边相同。
+长稿或改动很多时先按行对比，再只在改动的行内做字符级对比，避免 O(N·D) 过慢。"""
+
+# 字符级对比允许的最大编辑距离，超过则退回按行对比
+MAX_CHAR_EDITS = 2000
+# 按行对比后，单个改动块两边合计不超过这么多字符才细化到字符级
+MAX_REFINE_CHARS = 4000
+# 去掉公共前后缀后两边合计超过这么多字符时直接先按行对比
+LINE_MODE_CHARS = 20000
+
+
+def myers_hunks(a, b, max_d=None):
+    """Myers O((N+M)·D) 最短编辑脚本，a、b 为任意可比较元素的序列。
+
+    返回按位置排序的差异块列表；编辑距离超过 max_d 时返回 None"""
+    n, m = len(a), len(b)
+    limit = n + m if max_d is None else min(max_d, n + m)
+    # v[k + offset] 为对角线 k 上走到的最远 x；trace[d] 保存第 d 轮开始前 k ∈ [-d-1, d+1] 的切片
+    offset = limit + 1
+    v = [0] * (2 * limit + 3)
+    trace = []
+    for d in range(limit + 1):
+        trace.append(v[offset - d - 1:offset + d + 2])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, n, m)
+    return None
+
+
+def _backtrack(trace, x, y):
+    """从终点沿 trace 回溯，把单步的删除 / 插入合并成差异块"""
+    steps = []
+    for d in range(len(trace) - 1, 0, -1):
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[k + d] < v[k + d + 2]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[prev_k + d + 1]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+        steps.append((prev_x, x, prev_y, y))
+        x, y = prev_x, prev_y
+    hunks = []
+    for i1, i2, j1, j2 in reversed(steps):
+        if hunks and hunks[-1][1] == i1 and hunks[-1][3] == j1:
+            hunks[-1] = (hunks[-1][0], i2, hunks[-1][2], j2)
+        else:
+            hunks.append((i1, i2, j1, j2))
+    return hunks
+
+
+def _line_starts(lines):
+    starts = [0]
+    for line in lines:
+        starts.append(starts[-1] + len(line))
+    return starts
+
+
+def _refine(a, b, i1, i2, j1, j2, max_d):
+    """把按行得到的改动块 a[i1:i2] → b[j1:j2] 细化成字符级差异块，太大或差异太多时整块返回"""
+    if (i2 - i1) + (j2 - j1) <= MAX_REFINE_CHARS:
+        inner = myers_hunks(a[i1:i2], b[j1:j2], max_d)
+        if inner is not None:
+            return [(i1 + x1, i1 + x2, j1 + y1, j1 + y2) for x1, x2, y1, y2 in inner]
+    return [(i1, i2, j1, j2)]
+
+
+def _line_mode(a, b, max_d):
+    lines_a = a.splitlines(keepends=True)
+    lines_b = b.splitlines(keepends=True)
+    line_hunks = myers_hunks(lines_a, lines_b, max_d)
+    if line_hunks is None:
+        line_hunks = [(0, len(lines_a), 0, len(lines_b))]
+    starts_a, starts_b = _line_starts(lines_a), _line_starts(lines_b)
+    hunks = []
+    for li1, li2, lj1, lj2 in line_hunks:
+        if li2 - li1 == lj2 - lj1 and starts_a[li2] - starts_a[li1] + starts_b[lj2] - starts_b[lj1] > MAX_REFINE_CHARS:
+            # 行数相同的大块逐行配对细化（整段改了几个词的常见情形）
+            for li, lj in zip(range(li1, li2), range(lj1, lj2)):
+                if lines_a[li] != lines_b[lj]:
+                    hunks.extend(_refine(a, b, starts_a[li], starts_a[li + 1], starts_b[lj], starts_b[lj + 1], max_d))
+        else:
+            hunks.extend(_refine(a, b, starts_a[li1], starts_a[li2], starts_b[lj1], starts_b[lj2], max_d))
+    return hunks
+
+
+def diff_hunks(a, b, max_d=MAX_CHAR_EDITS):
+    """字符串 a → b 的字符级差异块。
+
+    先去掉公共前后缀；中间部分较短时直接字符级对比，较长或编辑距离超过 max_d 时
+    先按行对比，再对不太大的改动块做字符级细化，其余整块视为替换"""
+    lo = 0
+    hi_a, hi_b = len(a), len(b)
+    while lo < hi_a and lo < hi_b and a[lo] == b[lo]:
+        lo += 1
+    while hi_a > lo and hi_b > lo and a[hi_a - 1] == b[hi_b - 1]:
+        hi_a -= 1
+        hi_b -= 1
+    if lo == hi_a and lo == hi_b:
+        return []
+    mid_a, mid_b = a[lo:hi_a], b[lo:hi_b]
+    hunks = None
+    if len(mid_a) + len(mid_b) <= LINE_MODE_CHARS:
+        hunks = myers_hunks(mid_a, mid_b, max_d)
+    if hunks is None:
+        hunks = _line_mode(mid_a, mid_b, max_d)
+    return [(lo + i1, lo + i2, lo + j1, lo + j2) for i1, i2, j1, j2 in hunks]
+
+
+def diff_changes(a, b, max_d=MAX_CHAR_EDITS):
+    """a → b 的变更列表，格式与 apply_adopted_changes 的变更记录一致：
+    {"old", "new", "pos": old 在 a 中的起点, "new_pos": new 在 b 中的起点}"""
+    return [{"old": a[i1:i2], "new": b[j1:j2], "pos": i1, "new_pos": j1}
+            for i1, i2, j1, j2 in diff_hunks(a, b, max_d)]
@@ -0,0 +1,39 @@
+"""本地 token 估算（不依赖分词器）
+
+中日韩文字和全角标点按 1 字 1 token，其余字符按约 4 个 1 token，
+每条消息另加格式开销。只用于预算和对比各环节的用量，不作计费依据。"""
+import re
+
+_WIDE = re.compile(r"[\u2e80-\u9fff\uf900-\ufaff\uff00-\uffef]")
+# 每条消息的角色、分隔符开销，以及回复开头的固定开销
+MESSAGE_OVERHEAD = 4
+REPLY_OVERHEAD = 3
+
+
+def estimate_tokens(text):
+    if not text:
+        return 0
+    wide = len(_WIDE.findall(text))
+    return wide + (len(text) - wide + 3) // 4
+
+
+def estimate_prompt_tokens(messages):
+    return sum(MESSAGE_OVERHEAD + estimate_tokens(m.get("content") or "") for m in messages) + REPLY_OVERHEAD
+
+
+def common_prefix_tokens(messages, other):
+    """两组消息按顺序拼接后的公共前缀折算成 token 数（用于估算服务端前缀缓存能复用的部分）"""
+    total = REPLY_OVERHEAD
+    for a, b in zip(messages, other):
+        ca, cb = a.get("content") or "", b.get("content") or ""
+        if a.get("role") != b.get("role"):
+            break
+        if ca == cb:
+            total += MESSAGE_OVERHEAD + estimate_tokens(ca)
+            continue
+        n = 0
+        limit = min(len(ca), len(cb))
+        while n < limit and ca[n] == cb[n]:
+            n += 1
+        return total + MESSAGE_OVERHEAD + estimate_tokens(ca[:n])
+    return total